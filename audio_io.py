@@ -0,0 +1,246 @@
+import io
+import json
+import os
+import subprocess
+import tempfile
+import wave
+import numpy as np
+import torch
+import torchaudio
+from audio_store import to_float32, to_pcm16
+
+# 音声トラックだけを処理して映像はそのままコピーする入力形式
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".mkv", ".m4v")
+
+
+# ffprobe でコンテナ情報（長さ・チャンネル数・サンプルレート）を取得
+def probe_audio(path):
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "stream=channels,sample_rate,bit_rate:format=duration",
+        "-of", "json", path,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFprobe Error: {result.stderr.strip()}")
+    info = json.loads(result.stdout or "{}")
+    streams = info.get("streams") or []
+    if not streams:
+        raise RuntimeError("音声ストリームが見つかりません")
+    stream = streams[0]
+    return {
+        "duration": float(info.get("format", {}).get("duration") or 0.0),
+        "channels": int(stream.get("channels") or 1),
+        "sample_rate": int(stream.get("sample_rate") or 0),
+        "bit_rate": int(stream["bit_rate"]) if str(stream.get("bit_rate", "")).isdigit() else 0,  # 不明なら 0
+    }
+
+
+# 指定区間だけを ffmpeg でデコードし [channels, samples] の float32 テンソルで返す
+# -ss を -i より前に置くことで入力側シーク（全体をデコードしない）になる
+# sr=None なら元のサンプルレートのまま返す
+def decode_segment(path, sr, start=0.0, duration=None, channels=None):
+    if channels is None:
+        channels = probe_audio(path)["channels"]
+    cmd = ["ffmpeg", "-v", "error", "-nostdin"]
+    if start > 0:
+        cmd += ["-ss", f"{start:.3f}"]
+    if duration is not None:
+        cmd += ["-t", f"{duration:.3f}"]
+    cmd += [
+        "-i", path, "-vn",
+        "-f", "f32le", "-acodec", "pcm_f32le",
+        "-ac", str(channels), *_rate_args(sr), "-",
+    ]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg Error: {result.stderr.decode(errors='replace').strip()}")
+    pcm = np.frombuffer(result.stdout, dtype=np.float32)
+    pcm = pcm[: len(pcm) - len(pcm) % channels]
+    return torch.from_numpy(pcm.reshape(-1, channels).T.copy())
+
+
+def _rate_args(sr):
+    return ["-ar", str(sr)] if sr else []
+
+
+# テンソルを WAV のバイト列に変換（一時ファイルを経由しない）
+def to_wav_bytes(audio, sr):
+    buf = io.BytesIO()
+    torchaudio.save(buf, to_pcm16(audio), sr, format="wav", encoding="PCM_S", bits_per_sample=16)
+    return buf.getvalue()
+
+
+# [channels, frames] のチャンクを受け取りながら 16bit PCM WAV を書き出す
+class WavWriter:
+    def __init__(self, path, sr, channels):
+        self._wav = wave.open(path, "wb")
+        self._wav.setnchannels(channels)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(sr)
+
+    def write(self, chunk):
+        self.write_frames(np.asarray(chunk).T)
+
+    # [frames, channels] のまま書く（メモリマップの再生バッファなど）
+    # 16bit PCM で連続した配列ならコピーせずにそのまま書き出す
+    def write_frames(self, frames):
+        pcm = np.ascontiguousarray(to_pcm16(frames), dtype="<i2")
+        self._wav.writeframes(memoryview(pcm).cast("B"))
+
+    def close(self):
+        self._wav.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# [frames, channels] の配列をブロック単位で 16bit PCM WAV に書き出す（全体を一度に変換しない）
+def save_wav_blocks(path, frames, sr, block=1 << 18):
+    with WavWriter(path, sr, frames.shape[1]) as w:
+        for i in range(0, len(frames), block):
+            w.write_frames(frames[i:i + block])
+
+
+# アップロード（ファイルライクオブジェクト）を固定サイズのブロックでディスクへ書き出す
+# getvalue() のような全体コピーを作らず、サイズ上限と長さ上限を超えたら途中で打ち切る
+# 長さは最初のブロックを書いた時点で一度 ffprobe し、ヘッダから分かる形式なら全体を待たずに拒否する
+def ingest_upload(fileobj, dest_path, max_bytes=None, max_duration=None, block=1 << 20):
+    fileobj.seek(0)
+    written = 0
+    probed = False
+    try:
+        with open(dest_path, "wb") as f:
+            while True:
+                data = fileobj.read(block)
+                if not data:
+                    break
+                written += len(data)
+                if max_bytes is not None and written > max_bytes:
+                    raise ValueError(f"ファイルサイズが上限 ({max_bytes / 2**20:.0f} MB) を超えています")
+                f.write(data)
+                if max_duration is not None and not probed:
+                    f.flush()
+                    _check_duration(dest_path, max_duration)
+                    probed = True
+        # 途中までのファイルでは長さを少なく見積もる形式（ヘッダのない MP3 など）があるので最後にも確認する
+        if max_duration is not None and not _check_duration(dest_path, max_duration):
+            raise ValueError("音声ストリームを読み取れません")
+    except Exception:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    return dest_path
+
+
+# 長さが取れたら上限と比較する（取れなければ False を返して後で再試行）
+def _check_duration(path, max_duration):
+    try:
+        duration = probe_audio(path)["duration"]
+    except RuntimeError:
+        return False
+    if duration <= 0:
+        return False
+    if duration > max_duration:
+        raise ValueError(f"音声の長さが上限 ({max_duration / 60:.0f} 分) を超えています（{duration / 60:.1f} 分）")
+    return True
+
+
+# 映像ストリームを含むか（MP3 のカバー画像のような添付画像は除く）
+def has_video(path):
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "v",
+        "-show_entries", "stream=codec_type:stream_disposition=attached_pic",
+        "-of", "json", path,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        return False
+    streams = json.loads(result.stdout or "{}").get("streams") or []
+    return any(not s.get("disposition", {}).get("attached_pic") for s in streams)
+
+
+# 音声ストリームだけをデコードし、block フレームずつ [channels, frames] のテンソルで返す
+# ffmpeg の標準出力から逐次読むので、ファイル全体をメモリにもディスクにも展開しない
+# sr=None なら元のサンプルレートのまま返す（resample.StreamResampler と組み合わせる）
+def stream_decode(path, sr, channels, block):
+    cmd = [
+        "ffmpeg", "-v", "error", "-nostdin",
+        "-i", path, "-vn",
+        "-f", "f32le", "-acodec", "pcm_f32le",
+        "-ac", str(channels), *_rate_args(sr), "-",
+    ]
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err)
+        try:
+            frame_bytes = 4 * channels
+            while True:
+                data = proc.stdout.read(block * frame_bytes)
+                if not data:
+                    break
+                pcm = np.frombuffer(data[: len(data) - len(data) % frame_bytes], dtype=np.float32)
+                yield torch.from_numpy(pcm.reshape(-1, channels).T.copy())
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+        if returncode != 0:
+            err.seek(0)
+            raise RuntimeError(f"FFmpeg Error: {err.read().decode(errors='replace').strip()}")
+
+
+VIDEO_AUDIO_BITRATE = 192000  # 多重化する音声のビットレート (bps)
+
+
+# 音声を差し替えた動画の大きさの見積もり（映像はコピーなので、元のファイルの音声分を入れ替える）
+# 元の音声のビットレートが分からなければ差し引かない（大きめに見積もる）
+def estimate_muxed_size(path, info, bitrate=VIDEO_AUDIO_BITRATE):
+    size = os.path.getsize(path) - info.get("bit_rate", 0) * info["duration"] / 8
+    return int(max(size, 0) + bitrate * info["duration"] / 8)
+
+
+# 強調後の音声を受け取りながら、元動画の映像を再エンコードせず (-c:v copy) に多重化する
+# 音声は標準入力へ流し込むので、中間の WAV ファイルを作らない
+class VideoMuxer:
+    def __init__(self, video_path, out_path, sr, channels, audio_codec="aac", bitrate=VIDEO_AUDIO_BITRATE):
+        cmd = [
+            "ffmpeg", "-v", "error", "-y",
+            "-i", video_path,
+            "-f", "f32le", "-ar", str(sr), "-ac", str(channels), "-i", "pipe:0",
+            "-map", "0:v", "-map", "1:a",
+            "-c:v", "copy", "-c:a", audio_codec, "-b:a", str(bitrate),
+            "-max_muxing_queue_size", "4096",
+            out_path,
+        ]
+        self.out_path = out_path
+        self._err = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._err)
+
+    # chunk: [channels, frames]
+    def write(self, chunk):
+        pcm = np.ascontiguousarray(to_float32(np.asarray(chunk)).T)
+        self._proc.stdin.write(pcm.astype("<f4", copy=False).tobytes())
+
+    # 途中で失敗したときは書きかけの出力を残さずに終了させる
+    def abort(self):
+        self._proc.kill()
+        self._proc.wait()
+        self._err.close()
+        if os.path.exists(self.out_path):
+            os.remove(self.out_path)
+
+    def close(self):
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self._proc.wait()
+        self._err.seek(0)
+        message = self._err.read().decode(errors="replace").strip()
+        self._err.close()
+        if returncode != 0:
+            raise RuntimeError(f"FFmpeg Error: {message}")
+        return self.out_path
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import numpy as np
+import torch
+
+PCM16_SCALE = 32768.0
+
+
+# 推論が終わった音声（再生・保存用に持ち続けるもの）は 16bit PCM で保持する（float32 の半分）
+# 推論そのものは float32 のまま行い、結果を受け取った時点で変換する
+def to_pcm16(audio):
+    if torch.is_tensor(audio):
+        if audio.dtype == torch.int16:
+            return audio
+        return (audio * PCM16_SCALE).clamp_(-32768, 32767).to(torch.int16)
+    audio = np.asarray(audio)
+    if audio.dtype == np.int16:
+        return audio
+    return np.clip(audio * np.float32(PCM16_SCALE), -32768, 32767).astype(np.int16)
+
+
+# 16bit PCM（または float）を float32 に戻す
+# out を渡すとそこへ直接書き込む（再生コールバックの出力バッファなど、一時配列を作らない）
+def to_float32(audio, out=None):
+    if torch.is_tensor(audio):
+        return audio.float() / PCM16_SCALE if audio.dtype == torch.int16 else audio.float()
+    if audio.dtype == np.int16:
+        return np.multiply(audio, np.float32(1.0 / PCM16_SCALE), out=out, dtype=np.float32)
+    if out is None:
+        return np.asarray(audio, dtype=np.float32)
+    out[...] = audio
+    return out
+
+
+# ディスク上のスクラッチファイルにメモリマップした [frames, channels] の音声バッファ
+# 再生コールバックなどはスライスを読むだけなので、常駐メモリは実際に触れた範囲に比例する
+class ScratchAudio:
+    def __init__(self, path, frames, channels, dtype=np.float32, mode="r+"):
+        self.path = path
+        self.frames = frames
+        self.channels = channels
+        self.array = np.memmap(path, dtype=dtype, mode=mode, shape=(frames, channels))
+
+    # 空のバッファを作成（ファイルは疎に確保されるので実メモリもディスクもすぐには消費しない）
+    @classmethod
+    def create(cls, frames, channels, dtype=np.float32, dir=None):
+        if frames <= 0:
+            raise RuntimeError("音声データが空です")
+        fd, path = tempfile.mkstemp(suffix=".raw", dir=dir)
+        os.close(fd)
+        return cls(path, frames, channels, dtype=dtype, mode="w+")
+
+    # 後ろに領域を足す（見積もりより長かった場合）。既に渡した配列は元の長さのまま使える
+    def grow(self, frames):
+        if frames <= self.frames:
+            return
+        dtype = self.array.dtype
+        self.array.flush()
+        with open(self.path, "r+b") as f:
+            f.truncate(frames * self.channels * dtype.itemsize)
+        self.array = np.memmap(self.path, dtype=dtype, mode="r+", shape=(frames, self.channels))
+        self.frames = frames
+
+    def __len__(self):
+        return self.frames
+
+    # マップを解放してスクラッチファイルを削除
+    def close(self):
+        if self.array is None:
+            return
+        self.array.flush()
+        self.array = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import argparse
+import threading
+import torch
+
+from processing import WARMUP_SECONDS, iter_enhance
+
+# 推論のチャンク長と torch のスレッド数を実機で計測して決める
+# 結果はホストごと（CPU 数・メモリ量・torch のバージョン）にプロファイルへ保存し、次回以降はそれを適用する
+# チャンク長は処理モード（モデル）ごとに速さもピークメモリも違うので、モードごとに計測して持つ
+#
+#   python autotune.py                  # 未計測のモードを計測して保存
+#   python autotune.py --tiers fast     # 指定したモードだけ
+#   python autotune.py --force          # 計測し直す
+#
+# 保存先は CLEARVOICE_TUNING_PROFILE（実行時の読み込みと同じパス。別のパスに保存するときもこの環境変数で指定する）
+# CLEARVOICE_AUTOTUNE=1 なら serve.py の起動時（ウォームアップ後）にも既定のモードが未計測なら計測する
+PROFILE_PATH = os.environ.get(
+    "CLEARVOICE_TUNING_PROFILE", os.path.join(os.path.expanduser("~"), ".cache", "clearvoice", "tuning.json")
+)
+AUTOTUNE_ON_START = os.environ.get("CLEARVOICE_AUTOTUNE", "0") == "1"
+CANDIDATE_CHUNKS = (5, 10, 20, 30, 60)  # 秒
+THREAD_PROBE_CHUNK = 10  # スレッド数を比べるときのチャンク長（秒）
+MEMORY_HEADROOM = 0.5  # 空きメモリのうちチャンク処理に使ってよい割合
+
+
+def _log(message):
+    print(f"[autotune] {message}", flush=True)
+
+
+def cpu_count():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _read_int(path):
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+        return None if value == "max" else int(value)
+    except (OSError, ValueError):
+        return None
+
+
+# コンテナのメモリ上限（cgroup）があればそれを、なければ物理メモリ量を返す
+def memory_limit():
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        value = _read_int(path)
+        if value and value < 1 << 60:
+            return value
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+# 今使える空きメモリ（バイト）。分からなければ None
+def available_memory():
+    cgroups = (
+        ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),
+        ("/sys/fs/cgroup/memory/memory.limit_in_bytes", "/sys/fs/cgroup/memory/memory.usage_in_bytes"),
+    )
+    for limit_path, usage_path in cgroups:
+        limit = _read_int(limit_path)
+        used = _read_int(usage_path)
+        if limit and limit < 1 << 60 and used is not None:
+            return max(0, limit - used)
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# 計測中の RSS のピーク（開始時点からの増分）を短い間隔でサンプリングする
+class PeakMemory:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.base = _rss()
+        self.peak = self.base
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = _rss()
+            if rss is not None and rss > self.peak:
+                self.peak = rss
+
+    def __enter__(self):
+        if self.base is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    @property
+    def delta_mb(self):
+        if self.base is None:
+            return None
+        return (self.peak - self.base) / 2**20
+
+
+def host_signature():
+    limit = memory_limit()
+    memory = f"{limit / 2**30:.1f}GiB" if limit else "unknown"
+    return f"cpus={cpu_count()} mem={memory} torch={torch.__version__}"
+
+
+def load_profile(path=PROFILE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f).get(host_signature())
+    except (OSError, ValueError):
+        return None
+
+
+def save_profile(profile, path=PROFILE_PATH):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data[host_signature()] = profile
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+# 1 条件分の計測: 実時間比（何倍速で処理できたか）とピークメモリ増分
+def measure(model, df_state, chunk_seconds, threads, audio_seconds):
+    sr = df_state.sr()
+    torch.set_num_threads(threads)
+    audio = torch.randn(1, int(audio_seconds * sr)) * 0.01
+    with PeakMemory() as mem:
+        start = time.perf_counter()
+        for _ in iter_enhance(model, df_state, audio, int(chunk_seconds * sr), int(WARMUP_SECONDS * sr)):
+            pass
+        elapsed = time.perf_counter() - start
+    return {"rtf": audio_seconds / elapsed, "peak_mb": mem.delta_mb}
+
+
+def _thread_candidates():
+    n = cpu_count()
+    candidates = {n}
+    t = 1
+    while t < n:
+        candidates.add(t)
+        t *= 2
+    return sorted(candidates)
+
+
+# 処理モードのチャンク長が計測済みか
+def is_tuned(tier, profile=None):
+    profile = profile if profile is not None else load_profile() or {}
+    return tier in profile.get("chunks", {})
+
+
+# スレッド数を固定チャンク長で比べてから、最速のスレッド数でチャンク長を比べる
+# スレッド数はホストで 1 つ（最初に計測したモードで決める。threads を指定したときは計測し直す）、
+# チャンク長は tier ごとに profile["chunks"][tier] に残す
+def tune(model, df_state, tier, chunks=CANDIDATE_CHUNKS, threads=None):
+    profile = dict(load_profile() or {})
+    _log(f"tuning {tier} on {host_signature()}")
+    if threads or "threads" not in profile:
+        thread_results = {}
+        for n in threads or _thread_candidates():
+            thread_results[n] = measure(model, df_state, THREAD_PROBE_CHUNK, n, THREAD_PROBE_CHUNK * 2)
+            _log(f"threads={n:<3} {thread_results[n]['rtf']:6.1f}x realtime")
+        profile["threads"] = max(thread_results, key=lambda n: thread_results[n]["rtf"])
+    best_threads = int(profile["threads"])
+
+    chunk_results = {}
+    for seconds in chunks:
+        chunk_results[seconds] = measure(model, df_state, seconds, best_threads, max(seconds * 2, 20))
+        peak = chunk_results[seconds]["peak_mb"]
+        _log(f"chunk={seconds:<3}s {chunk_results[seconds]['rtf']:6.1f}x realtime, peak "
+             + (f"+{peak:.0f} MB" if peak is not None else "n/a"))
+
+    # 以前の形式（モードを区別しない chunks / chunk_seconds）は捨てて計測し直した分だけを残す
+    if not isinstance(profile.get("chunk_seconds"), dict):
+        profile.pop("chunks", None)
+        profile["chunk_seconds"] = {}
+    profile.setdefault("chunks", {})[tier] = {str(s): r for s, r in chunk_results.items()}
+    profile["chunk_seconds"][tier] = max(chunk_results, key=lambda s: chunk_results[s]["rtf"])
+    profile["tuned_at"] = time.time()
+    save_profile(profile)
+    _log(f"saved: threads={best_threads}, chunk[{tier}]={profile['chunk_seconds'][tier]}s -> {PROFILE_PATH}")
+    apply(profile)
+    return profile
+
+
+# プロファイルのスレッド数を適用する（未計測なら torch の既定のまま）
+def apply(profile=None):
+    profile = profile or load_profile()
+    if profile and "threads" in profile:
+        torch.set_num_threads(int(profile["threads"]))
+    return profile
+
+
+# benchmark.py tiers で計測した段階ごとの実時間比を同じプロファイルに残す
+def save_tier_realtime(tier, rtf, path=PROFILE_PATH):
+    profile = load_profile(path) or {}
+    profile.setdefault("tiers", {})[tier] = rtf
+    save_profile(profile, path)
+
+
+def tier_realtime(tier):
+    profile = load_profile() or {}
+    return profile.get("tiers", {}).get(tier)
+
+
+# 実行時のチャンク長（秒）: 処理モード tier のプロファイルで最速だったものを使い、
+# 空きメモリが少なければ計測したピークメモリが収まる範囲で最速のものまで下げる
+def chunk_seconds(default, tier, maximum=None):
+    profile = load_profile() or {}
+    if not is_tuned(tier, profile):
+        return default if maximum is None else min(default, maximum)
+    results = {float(s): r for s, r in profile["chunks"][tier].items()}
+    candidates = [s for s in results if maximum is None or s <= maximum] or [min(results)]
+    free = available_memory()
+    if free is not None:
+        budget = free * MEMORY_HEADROOM / 2**20
+        fitting = [s for s in candidates if results[s]["peak_mb"] is None or results[s]["peak_mb"] <= budget]
+        if len(fitting) < len(candidates):
+            _log(f"memory pressure ({free / 2**20:.0f} MB free): limiting chunk size")
+        candidates = fitting or [min(candidates)]
+    return max(candidates, key=lambda s: results[s]["rtf"])
+
+
+def main():
+    import model_service
+    parser = argparse.ArgumentParser(
+        description=f"Tune chunk size and thread count for this host (profile: $CLEARVOICE_TUNING_PROFILE = {PROFILE_PATH})"
+    )
+    parser.add_argument("--force", action="store_true", help="Re-run even if the tier is already tuned on this host")
+    parser.add_argument("--tiers", nargs="+", choices=list(model_service.TIERS), default=list(model_service.TIERS),
+                        help="Tiers to tune (default: all)")
+    parser.add_argument("--chunks", type=float, nargs="+", default=list(CANDIDATE_CHUNKS), help="Candidate chunk sizes (seconds)")
+    parser.add_argument("--threads", type=int, nargs="+", help="Candidate torch thread counts (default: powers of two up to the CPU count)")
+    args = parser.parse_args()
+
+    threads = args.threads
+    if args.force and not threads:
+        threads = _thread_candidates()  # --force ならスレッド数も計測し直す
+    for tier in args.tiers:
+        existing = load_profile() or {}
+        if is_tuned(tier, existing) and not args.force:
+            print(f"{tier}: threads={existing['threads']}, chunk={existing['chunk_seconds'][tier]}s (use --force to re-run)")
+            continue
+        model, df_state = model_service.get_model(tier)
+        tune(model, df_state, tier, args.chunks, threads)
+        threads = None  # スレッド数は最初のモードで決めたものを使い回す
+
+
+if __name__ == "__main__":
+    main()
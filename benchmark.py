@@ -0,0 +1,120 @@
+import argparse
+import time
+import torch
+import torchaudio
+
+from resample import StreamResampler, polyphase_kernel, resample
+from processing import enhance_window
+
+TARGET_SR = 48000
+
+
+def _timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _row(name, seconds, audio_seconds):
+    print(f"  {name:<32} {seconds * 1000:9.1f} ms   {audio_seconds / seconds:8.1f}x realtime")
+
+
+# 非 48kHz 入力のレート変換: 従来の全体一括 (torchaudio) とキャッシュ付きストリーム版の比較
+def bench_resample(args):
+    for src in args.rates:
+        x = torch.randn(args.channels, int(src * args.seconds)) * 0.1
+        print(f"{src} Hz -> {TARGET_SR} Hz, {args.channels} ch, {args.seconds:.0f} s")
+
+        _row("torchaudio (whole tensor)", _timeit(
+            lambda: torchaudio.functional.resample(x, src, TARGET_SR), args.repeat), args.seconds)
+
+        def cold():
+            polyphase_kernel.cache_clear()
+            resample(x, src, TARGET_SR)
+        _row("polyphase, cold kernel cache", _timeit(cold, args.repeat), args.seconds)
+
+        polyphase_kernel(src, TARGET_SR)
+        _row("polyphase, cached (whole)", _timeit(lambda: resample(x, src, TARGET_SR), args.repeat), args.seconds)
+
+        def streamed():
+            rs = StreamResampler(src, TARGET_SR, args.channels)
+            for i in range(0, x.shape[1], src):
+                rs.process(x[:, i:i + src])
+            rs.flush()
+        _row("polyphase, cached (1 s blocks)", _timeit(streamed, args.repeat), args.seconds)
+
+
+# 多チャンネル音声: 全チャンネルを 1 バッチで処理する場合、チャンネルごとに処理する場合、
+# モノラルにまとめて処理する場合のチャンネルあたりのコスト
+def bench_channels(args):
+    from df.enhance import init_df
+    model, df_state, _ = init_df()
+    sr = df_state.sr()
+    n = int(sr * args.seconds)
+    for channels in args.channels:
+        x = torch.randn(channels, n) * 0.01
+        print(f"{channels} ch, {args.seconds:.0f} s")
+
+        def per_channel():
+            for c in range(channels):
+                enhance_window(model, df_state, x[c:c + 1], 0, n, 0)
+        t_loop = _timeit(per_channel, args.repeat)
+        _row("per channel (loop)", t_loop, args.seconds)
+        t_batch = _timeit(lambda: enhance_window(model, df_state, x, 0, n, 0), args.repeat)
+        _row("batched (one forward pass)", t_batch, args.seconds)
+        t_mix = _timeit(lambda: enhance_window(model, df_state, x, 0, n, 0, downmix=True), args.repeat)
+        _row("downmix -> enhance -> upmix", t_mix, args.seconds)
+        print(f"  per-channel cost: loop {t_loop / channels * 1000:.1f} ms, batched {t_batch / channels * 1000:.1f} ms, "
+              f"downmix {t_mix / channels * 1000:.1f} ms")
+
+
+# 処理モード（モデルの種類）ごとの実時間比。結果はチューニングプロファイルに保存し、各 UI の選択肢に併記される
+def bench_tiers(args):
+    import autotune
+    import model_service
+    for tier in args.tiers:
+        model, df_state = model_service.get_model(tier)
+        x = torch.randn(1, int(df_state.sr() * args.seconds)) * 0.01
+        n = x.shape[1]
+        enhance_window(model, df_state, x, 0, n, 0)
+        seconds = _timeit(lambda: enhance_window(model, df_state, x, 0, n, 0), args.repeat)
+        _row(f"{tier} ({model_service.TIERS[tier]['model']})", seconds, args.seconds)
+        if not args.no_save:
+            autotune.save_tier_realtime(tier, args.seconds / seconds)
+    if not args.no_save:
+        print(f"Saved to {autotune.PROFILE_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ClearVoice AI benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("resample", help="Compare resampling paths for non-48 kHz input")
+    p.add_argument("--rates", type=int, nargs="+", default=[16000, 22050, 44100])
+    p.add_argument("--seconds", type=float, default=60.0)
+    p.add_argument("--channels", type=int, default=1)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_resample)
+
+    p = sub.add_parser("channels", help="Compare batched, per-channel and downmixed enhancement of multichannel audio")
+    p.add_argument("--channels", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--seconds", type=float, default=10.0)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_channels)
+
+    p = sub.add_parser("tiers", help="Measure the realtime factor of each speed/quality tier")
+    p.add_argument("--tiers", nargs="+", default=["quality", "fast"])
+    p.add_argument("--seconds", type=float, default=20.0)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--no-save", action="store_true", help="Do not store the results in the tuning profile")
+    p.set_defaults(func=bench_tiers)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
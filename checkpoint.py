@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+import numpy as np
+import torch
+from audio_store import to_float32, to_pcm16
+
+# チェックポイントの保存先（Cloud Run ではバケットをマウントしたディレクトリを指定するとインスタンスをまたいで再開できる）
+# 既定の /tmp はインスタンスごと（Cloud Run ではメモリ上）なので、再起動後の再開には cloudbuild.yaml のマウントが必要
+CHECKPOINT_DIR = os.environ.get("CLEARVOICE_CHECKPOINT_DIR", os.path.join("/tmp", "clearvoice_jobs"))
+CHECKPOINT_TTL = 24 * 60 * 60  # 放置されたジョブを消すまでの秒数
+LOCK_NAME = "owner.lock"
+LOCK_HEARTBEAT = 15  # 処理中のジョブがロックファイルの更新時刻を進める間隔（秒）
+LOCK_STALE = 90  # これより長く更新されていないロックは持ち主が落ちたとみなして引き継ぐ（秒）
+
+
+# 入力ファイルの内容ハッシュ（ブロック単位で読むので大きなファイルでもメモリを使わない）
+def file_digest(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(block), b""):
+            h.update(data)
+    return h.hexdigest()
+
+
+# 古いジョブディレクトリを削除
+def cleanup(root=CHECKPOINT_DIR, max_age=CHECKPOINT_TTL):
+    if not os.path.isdir(root):
+        return
+    now = time.time()
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if _lock_alive(path):
+                continue
+            if now - os.path.getmtime(path) > max_age:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+# 他のセッションが処理中（ロックの更新時刻が新しい）かどうか
+def _lock_alive(path):
+    try:
+        return time.time() - os.path.getmtime(os.path.join(path, LOCK_NAME)) < LOCK_STALE
+    except OSError:
+        return False
+
+
+# 完了したセグメントと次の開始位置をディスクに残し、途中で落ちても続きから処理できるようにするジョブ
+# 各セグメントは直前の文脈ごと強調して文脈を捨てているので、出力は入力だけで決まり、
+# 再開後も中断しなかった場合と同じ結果になる（保存すべきストリーム状態は次の開始位置のみ）
+class CheckpointJob:
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.owner = uuid.uuid4().hex
+        self._owned = False
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    # 入力と処理パラメータが同じジョブがあれば再開し、なければ新しく作る
+    # chunk（チャンク長）はキーに含めずマニフェストに残す。空きメモリによって実行時のチャンク長が
+    # 変わっても、再開時は保存済みのセグメントと同じ区切りで続ける（job.chunk を使う）
+    # ジョブは開いたセッションが所有する。同じ入力を別のセッションが処理中なら、その途中結果は使わず
+    # 自分専用のディレクトリで最初から処理する（相手の完了・削除に巻き込まれない）
+    @classmethod
+    def open(cls, input_digest, params, total, chunk=None, root=CHECKPOINT_DIR):
+        key = hashlib.sha256(json.dumps([input_digest, params, total], sort_keys=True).encode()).hexdigest()[:32]
+        job = cls._load(os.path.join(root, key), params, total, chunk)
+        if job._acquire():
+            return job
+        job = cls._load(os.path.join(root, f"{key}-{uuid.uuid4().hex[:8]}"), params, total, chunk)
+        if not job._acquire():
+            raise RuntimeError("チェックポイントのロックを取得できませんでした")
+        return job
+
+    @classmethod
+    def _load(cls, path, params, total, chunk):
+        manifest_path = os.path.join(path, "manifest.json")
+        if os.path.isfile(manifest_path):
+            try:
+                with open(manifest_path) as f:
+                    return cls(path, json.load(f))
+            except (OSError, ValueError):
+                if _lock_alive(path):
+                    return cls(path, {})
+                shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+        return cls(path, {"params": params, "total": total, "chunk": chunk, "segments": [], "next_start": 0})
+
+    # ロックファイルを排他的に作って所有者になる。持ち主が落ちて更新が止まったロックだけを引き継ぐ
+    def _acquire(self):
+        lock = os.path.join(self.path, LOCK_NAME)
+        for _ in range(2):
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if _lock_alive(self.path):
+                    return False
+                # 古いロックは名前を変えてから消す（同時に引き継ごうとしたセッションのうち一方だけが成功する）
+                stale = f"{lock}.{self.owner}"
+                try:
+                    os.rename(lock, stale)
+                    os.remove(stale)
+                except OSError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(self.owner)
+            break
+        else:
+            return False
+        self._owned = True
+        # 引き継いだ場合もマニフェストを読み直してから使う（ロック取得前の内容は古いかもしれない）
+        try:
+            with open(os.path.join(self.path, "manifest.json")) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            if not self.manifest:
+                self.release()
+                return False
+            self._write_manifest()
+        self._heartbeat = threading.Thread(target=self._beat, name="checkpoint-heartbeat", daemon=True)
+        self._heartbeat.start()
+        return True
+
+    def _beat(self):
+        lock = os.path.join(self.path, LOCK_NAME)
+        while not self._stop.wait(LOCK_HEARTBEAT):
+            try:
+                os.utime(lock)
+            except OSError:
+                return
+
+    def _is_owner(self):
+        try:
+            with open(os.path.join(self.path, LOCK_NAME)) as f:
+                return self._owned and f.read() == self.owner
+        except OSError:
+            return False
+
+    @property
+    def chunk(self):
+        return self.manifest.get("chunk")
+
+    @property
+    def next_start(self):
+        return self.manifest["next_start"]
+
+    @property
+    def done(self):
+        return self.next_start >= self.manifest["total"]
+
+    # セグメントを保存してからマニフェストを更新する（どちらも置き換えで書くので途中で落ちても壊れない）
+    # 出力と同じ 16bit PCM で保存する（float32 の半分）
+    def save(self, start, enhanced):
+        name = f"seg_{start:012d}.npy"
+        tmp = os.path.join(self.path, name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, to_pcm16(enhanced.cpu().numpy()))
+        os.replace(tmp, os.path.join(self.path, name))
+        self.manifest["segments"].append({"start": start, "file": name})
+        self.manifest["next_start"] = start + enhanced.shape[1]
+        self._write_manifest()
+
+    # 保存済みのセグメントを (開始位置, float32 テンソル) で順に返す
+    def iter_segments(self):
+        for seg in self.manifest["segments"]:
+            yield seg["start"], torch.from_numpy(to_float32(np.load(os.path.join(self.path, seg["file"]))))
+
+    # ロックを手放す（途中結果は残すので、後で同じ入力を処理すると続きから再開できる）
+    def release(self):
+        self._stop_heartbeat()
+        if self._is_owner():
+            try:
+                os.remove(os.path.join(self.path, LOCK_NAME))
+            except OSError:
+                pass
+        self._owned = False
+
+    # 完了したジョブを削除する（所有者だけが消せる）
+    def remove(self):
+        self._stop_heartbeat()
+        if self._is_owner():
+            shutil.rmtree(self.path, ignore_errors=True)
+        self._owned = False
+
+    def _stop_heartbeat(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    def _write_manifest(self):
+        tmp = os.path.join(self.path, "manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, os.path.join(self.path, "manifest.json"))
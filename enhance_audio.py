@@ -1,11 +1,82 @@
 import os
 import argparse
-from df.enhance import enhance, init_df, load_audio, save_audio
+import torch
+from df.enhance import save_audio
+import autotune
+import model_service
+from audio_io import VIDEO_EXTENSIONS, VideoMuxer, WavWriter, has_video, probe_audio, stream_decode
+from processing import WARMUP_SECONDS, iter_enhance_stream
+from resample import resample_stream
+
+# 逐次処理の単位（秒）
+STREAM_CHUNK_SECONDS = 30
+
+
+# 音声: 元のレートのままデコードし、キャッシュしたポリフェーズ係数でブロックごとにモデルのレートへ変換して強調する
+# keep_rate=True なら強調結果を元のサンプルレートに戻して保存する
+def enhance_file(model, df_state, input_path, output_path, keep_rate=False, downmix=False, tier=model_service.DEFAULT_TIER):
+    sr = df_state.sr()
+    info = probe_audio(input_path)
+    channels = info["channels"]
+    src_sr = info["sample_rate"]
+    if src_sr:
+        blocks = resample_stream(stream_decode(input_path, None, channels, block=src_sr), src_sr, sr, channels)
+    else:
+        src_sr = sr
+        blocks = stream_decode(input_path, sr, channels, block=sr)
+    out_sr = src_sr if keep_rate else sr
+
+    def enhanced_blocks():
+        for start, enhanced, _ in iter_enhance_stream(
+            model, df_state, blocks, int(autotune.chunk_seconds(STREAM_CHUNK_SECONDS, tier) * sr), int(WARMUP_SECONDS * sr),
+            downmix=downmix
+        ):
+            print(f"  {(start + enhanced.shape[1]) / sr:.0f}s processed")
+            yield enhanced
+
+    out_blocks = resample_stream(enhanced_blocks(), sr, out_sr, channels)
+    if output_path.lower().endswith(".wav"):
+        with WavWriter(output_path, out_sr, channels) as w:
+            for block in out_blocks:
+                w.write(block)
+    else:
+        save_audio(output_path, torch.cat(list(out_blocks), dim=1), sr=out_sr)
+
+
+# 動画: 音声トラックだけをストリームで強調し、映像は再エンコードせずに書き戻す
+def enhance_video(model, df_state, input_path, output_path, downmix=False, tier=model_service.DEFAULT_TIER):
+    sr = df_state.sr()
+    channels = probe_audio(input_path)["channels"]
+    muxer = VideoMuxer(input_path, output_path, sr, channels)
+    try:
+        blocks = stream_decode(input_path, sr, channels, block=sr)
+        for start, enhanced, _ in iter_enhance_stream(
+            model, df_state, blocks, int(autotune.chunk_seconds(STREAM_CHUNK_SECONDS, tier) * sr), int(WARMUP_SECONDS * sr),
+            downmix=downmix
+        ):
+            muxer.write(enhanced)
+            print(f"  {(start + enhanced.shape[1]) / sr:.0f}s processed")
+    except BaseException:
+        muxer.abort()
+        raise
+    muxer.close()
+
+# --tier の説明: 計測済みなら各段階の実時間比を併記する
+def tier_help():
+    items = []
+    for tier, info in model_service.TIERS.items():
+        rtf = model_service.realtime_factor(tier)
+        items.append(f"{tier} = {info['model']}" + (f", ~{rtf:.0f}x realtime" if rtf else ""))
+    return "Speed/quality tier: " + "; ".join(items) + " (measure with 'python benchmark.py tiers')"
+
 
 def main():
-    parser = argparse.ArgumentParser(description="DeepFilterNet Audio Enhancement")
+    parser = argparse.ArgumentParser(description="DeepFilterNet Audio Enhancement (audio or MP4/MOV/MKV video)")
     parser.add_argument("input", help="Input audio file")
     parser.add_argument("-o", "--output", help="Output audio file (optional)")
+    parser.add_argument("--keep-rate", action="store_true", help="Write audio output at the input's sample rate instead of 48 kHz")
+    parser.add_argument("--tier", choices=list(model_service.TIERS), default=model_service.DEFAULT_TIER, help=tier_help())
+    parser.add_argument("--downmix", action="store_true", help="Enhance a mono downmix and copy it to every channel (faster for multichannel input)")
     args = parser.parse_args()
 
     input_path = args.input
@@ -18,17 +89,19 @@ def main():
         base, ext = os.path.splitext(input_path)
         output_path = base + "_enhanced" + ext
 
-    print(f"Initializing DeepFilterNet...")
-    model, df_state, _ = init_df()
+    print(f"Initializing {model_service.TIERS[args.tier]['model']}...")
+    model, df_state = model_service.get_model(args.tier)
 
-    print(f"Loading audio: {input_path}")
-    audio, info = load_audio(input_path, sr=df_state.sr())
-
-    print(f"Enhancing audio...")
-    enhanced = enhance(model, df_state, audio)
+    if os.path.splitext(input_path)[1].lower() in VIDEO_EXTENSIONS and has_video(input_path):
+        print(f"Enhancing video audio track: {input_path}")
+        enhance_video(model, df_state, input_path, output_path, downmix=args.downmix, tier=args.tier)
+        print(f"Saved: {output_path}")
+        print("Done!")
+        return
 
-    print(f"Saving enhanced audio: {output_path}")
-    save_audio(output_path, enhanced, sr=df_state.sr())
+    print(f"Enhancing audio: {input_path}")
+    enhance_file(model, df_state, input_path, output_path, keep_rate=args.keep_rate, downmix=args.downmix, tier=args.tier)
+    print(f"Saved: {output_path}")
     print("Done!")
 
 if __name__ == "__main__":
@@ -1,22 +1,46 @@
 import os
+import math
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import threading
-import torch
 import numpy as np
 import sounddevice as sd
 import time
-from df.enhance import enhance, init_df, load_audio, save_audio
+import tempfile
+import shutil
+import model_service
+from audio_io import VIDEO_EXTENSIONS, VideoMuxer, WavWriter, has_video, probe_audio, save_wav_blocks, stream_decode
+from resample import resample_stream
+from audio_store import ScratchAudio, to_float32, to_pcm16
+from waveform import FLOOR_DB, PyramidBuilder
+from processing import PREVIEW_SECONDS, WARMUP_SECONDS, iter_enhance_stream, preview_file
+import autotune
+
+# 逐次処理の単位（秒）。小さいほど再生開始までが短くなる
+STREAM_CHUNK_SECONDS = 10.0
+
+
+# 出力デバイスのチャンネル数より多い音源（5.1ch など）を再生するためのミックス行列 [channels, out_channels]
+# 偶数番目のチャンネルを左、奇数番目を右にまとめる（モノラル出力なら全チャンネルの平均）
+def playback_mix(channels, out_channels):
+    mix = np.zeros((channels, out_channels), dtype=np.float32)
+    for c in range(channels):
+        mix[c, c % out_channels] = 1.0
+    return mix / mix.sum(axis=0, keepdims=True)
 
 class DeepFilterGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("DeepFilterNet Audio Enhancer")
-        self.root.geometry("500x650")
+        self.root.geometry("500x985")
 
         self.input_path = tk.StringVar()
         self.attenuation = tk.DoubleVar(value=0)
         self.post_filter = tk.BooleanVar(value=False)
+        self.preview_pos = tk.DoubleVar(value=0)
+        self.keep_rate = tk.BooleanVar(value=False)
+        self.downmix = tk.BooleanVar(value=False)
+        self.tier_choice = tk.StringVar(value=model_service.tier_label(model_service.DEFAULT_TIER))
         self.status_text = tk.StringVar(value="準備完了")
         
         # 再生用の状態
@@ -27,6 +51,20 @@ class DeepFilterGUI:
         self.play_source = tk.StringVar(value="enhanced") # "original" or "enhanced"
         self.stream = None
         self.play_ptr = 0
+        self.processed_frames = 0  # 強調済みのフレーム数（これより先はまだ再生できない）
+
+        # 長時間ファイル用のスクラッチ領域（再生用の音声はここにメモリマップする）
+        self.scratch_dir = tempfile.mkdtemp(prefix="deepfilter_gui_")
+        self.original_scratch = None
+        self.enhanced_scratch = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # 波形・スペクトログラム表示用のピラミッドと表示範囲（フレーム）
+        self.orig_pyramid = None
+        self.enh_pyramid = None
+        self.view_range = (0, 0)
+        self.show_spectrogram = tk.BooleanVar(value=False)
+        self._spec_image = None
 
         self.create_widgets()
         
@@ -49,16 +87,36 @@ class DeepFilterGUI:
         param_frame = ttk.LabelFrame(self.root, text="パラメータ設定")
         param_frame.pack(fill="x", **padding)
 
+        # 処理モード（速度/品質の段階）
+        ttk.Label(param_frame, text="処理モード:").pack(anchor="w", padx=5)
+        self.tier_combo = ttk.Combobox(param_frame, textvariable=self.tier_choice, state="readonly")
+        self.tier_combo.pack(fill="x", padx=5, pady=(0, 5))
+        self.refresh_tiers()
+
         # Attenuation スライダー
         ttk.Label(param_frame, text="ノイズ減衰の制限 (dB):").pack(anchor="w", padx=5)
         ttk.Label(param_frame, text="※0で制限なし（最大除去）、値を大きくするとノイズを残します", font=("", 10)).pack(anchor="w", padx=5)
         scale = ttk.Scale(param_frame, from_=0, to=100, variable=self.attenuation, orient="horizontal")
         scale.pack(fill="x", padx=5, pady=(0, 5))
         ttk.Label(param_frame, textvariable=self.attenuation).pack(anchor="e", padx=5)
+        ttk.Checkbutton(param_frame, text="元のサンプルレートで保存（WAV出力）", variable=self.keep_rate).pack(anchor="w", padx=5)
+        ttk.Checkbutton(param_frame, text="高速モード（モノラルにまとめて処理）", variable=self.downmix).pack(anchor="w", padx=5)
+
+        # プレビュー位置（指定位置の周辺だけを処理して試聴する）
+        ttk.Label(param_frame, text=f"プレビュー位置 (中心の {PREVIEW_SECONDS:.0f} 秒間を処理):").pack(anchor="w", padx=5)
+        self.preview_scale = ttk.Scale(param_frame, from_=0, to=0, variable=self.preview_pos, orient="horizontal",
+                                       command=self.on_preview_pos_change)
+        self.preview_scale.pack(fill="x", padx=5, pady=(0, 5))
+        self.preview_pos_label = ttk.Label(param_frame, text="00:00")
+        self.preview_pos_label.pack(anchor="e", padx=5)
 
         # 実行ボタン
-        self.run_button = ttk.Button(self.root, text="ノイズ除去を開始", command=self.start_enhancement, state="disabled")
-        self.run_button.pack(pady=10)
+        button_frame = ttk.Frame(self.root)
+        button_frame.pack(pady=10)
+        self.preview_button = ttk.Button(button_frame, text="プレビュー", command=self.start_preview, state="disabled")
+        self.preview_button.pack(side="left", padx=5)
+        self.run_button = ttk.Button(button_frame, text="ノイズ除去を開始", command=self.start_enhancement, state="disabled")
+        self.run_button.pack(side="left", padx=5)
 
         # 進捗表示フレーム
         progress_frame = ttk.Frame(self.root)
@@ -75,6 +133,19 @@ class DeepFilterGUI:
         preview_frame = ttk.LabelFrame(self.root, text="プレビュー・比較再生")
         preview_frame.pack(fill="x", **padding)
         
+        # 波形・スペクトログラム表示（クリックでシーク）
+        self.overview_canvas = tk.Canvas(preview_frame, height=90, background="#111111", highlightthickness=0)
+        self.overview_canvas.pack(fill="x", padx=5, pady=(5, 0))
+        self.overview_canvas.bind("<Configure>", lambda e: self.draw_overview())
+        self.overview_canvas.bind("<Button-1>", self.on_overview_click)
+
+        view_frame = ttk.Frame(preview_frame)
+        view_frame.pack(fill="x", padx=5)
+        ttk.Checkbutton(view_frame, text="スペクトログラム", variable=self.show_spectrogram, command=self.draw_overview).pack(side="left")
+        ttk.Button(view_frame, text="全体", width=4, command=self.zoom_all).pack(side="right")
+        ttk.Button(view_frame, text="−", width=3, command=lambda: self.zoom(2.0)).pack(side="right")
+        ttk.Button(view_frame, text="+", width=3, command=lambda: self.zoom(0.5)).pack(side="right")
+
         # タイムラインスライダー
         self.timeline_var = tk.DoubleVar(value=0)
         self.is_dragging = False
@@ -86,6 +157,11 @@ class DeepFilterGUI:
         self.timeline_scale.bind("<ButtonRelease-1>", self.on_timeline_release)
         self.timeline_scale.bind("<Button-1>", self.on_timeline_press)
 
+        # 処理済みの範囲（再生可能な位置）を示すバー
+        self.horizon_var = tk.DoubleVar(value=0)
+        self.horizon_bar = ttk.Progressbar(preview_frame, variable=self.horizon_var, maximum=100)
+        self.horizon_bar.pack(fill="x", padx=5, pady=(0, 5))
+
         # 時間表示
         self.time_label = ttk.Label(preview_frame, text="00:00 / 00:00")
         self.time_label.pack()
@@ -97,10 +173,10 @@ class DeepFilterGUI:
         switch_frame = ttk.Frame(preview_frame)
         switch_frame.pack(pady=5)
         
-        self.orig_radio = ttk.Radiobutton(switch_frame, text="元の音源", variable=self.play_source, value="original", state="disabled")
+        self.orig_radio = ttk.Radiobutton(switch_frame, text="元の音源", variable=self.play_source, value="original", state="disabled", command=self.draw_overview)
         self.orig_radio.pack(side="left", padx=10)
         
-        self.enh_radio = ttk.Radiobutton(switch_frame, text="除去後", variable=self.play_source, value="enhanced", state="disabled")
+        self.enh_radio = ttk.Radiobutton(switch_frame, text="除去後", variable=self.play_source, value="enhanced", state="disabled", command=self.draw_overview)
         self.enh_radio.pack(side="left", padx=10)
 
         # ステータス表示
@@ -108,19 +184,54 @@ class DeepFilterGUI:
         status_label.pack(pady=10)
 
     def browse_file(self):
-        filename = filedialog.askopenfilename(filetypes=[("Audio Files", "*.wav *.m4a *.mp3 *.flac")])
+        filename = filedialog.askopenfilename(filetypes=[
+            ("Audio / Video Files", "*.wav *.m4a *.mp3 *.flac *.mp4 *.mov *.mkv *.m4v"),
+            ("Audio Files", "*.wav *.m4a *.mp3 *.flac"),
+            ("Video Files", "*.mp4 *.mov *.mkv *.m4v"),
+        ])
         if filename:
             self.input_path.set(filename)
+            # プレビュー位置の範囲をファイル長に合わせる
+            try:
+                duration = probe_audio(filename)["duration"]
+            except Exception:
+                duration = 0
+            self.preview_scale.config(to=duration)
+            self.preview_pos.set(0)
+            self.on_preview_pos_change(0)
+
+    def on_preview_pos_change(self, val):
+        sec = int(float(val))
+        self.preview_pos_label.config(text=f"{sec//60:02}:{sec%60:02}")
 
     def initialize_model(self):
         self.status_text.set("モデルを初期化中...")
         try:
-            self.model, self.df_state, _ = init_df()
+            self.model, self.df_state = model_service.get_model()
+            # 最初の処理を待たせないようにダミー推論で温め、計測した速度を選択肢に表示する
+            model_service.warm_up(self.model, self.df_state)
+            self.root.after_idle(self.refresh_tiers)
             self.status_text.set("準備完了")
             self.run_button.config(state="normal")
+            self.preview_button.config(state="normal")
         except Exception as e:
             self.status_text.set(f"初期化エラー: {str(e)}")
 
+    def refresh_tiers(self):
+        tier = self.selected_tier()
+        self.tier_labels = {model_service.tier_label(t): t for t in model_service.TIERS}
+        self.tier_combo.config(values=list(self.tier_labels))
+        self.tier_choice.set(model_service.tier_label(tier))
+
+    def selected_tier(self):
+        return getattr(self, "tier_labels", {}).get(self.tier_choice.get(), model_service.DEFAULT_TIER)
+
+    # 選択された処理モードのモデルに切り替える（初めて選ばれたときだけ読み込む）
+    def use_selected_tier(self):
+        tier = self.selected_tier()
+        self.status_text.set(f"{model_service.TIERS[tier]['model']} を準備中...")
+        self.model, self.df_state = model_service.get_model(tier)
+
     def start_enhancement(self):
         input_file = self.input_path.get()
         if not input_file:
@@ -129,6 +240,7 @@ class DeepFilterGUI:
         
         self.stop_playback()
         self.run_button.config(state="disabled")
+        self.preview_button.config(state="disabled")
         self.play_button.config(state="disabled")
         self.orig_radio.config(state="disabled")
         self.enh_radio.config(state="disabled")
@@ -139,83 +251,289 @@ class DeepFilterGUI:
         # 処理を別スレッドで実行
         threading.Thread(target=self.process_audio, args=(input_file,), daemon=True).start()
 
+    def start_preview(self):
+        input_file = self.input_path.get()
+        if not input_file:
+            messagebox.showwarning("警告", "ファイルを選択してください")
+            return
+
+        self.stop_playback()
+        self.run_button.config(state="disabled")
+        self.preview_button.config(state="disabled")
+        self.status_text.set("プレビュー生成中...")
+        threading.Thread(target=self.process_preview, args=(input_file,), daemon=True).start()
+
+    def process_preview(self, input_path):
+        try:
+            self.use_selected_tier()
+            proc_start = time.time()
+            original, enhanced, start = preview_file(
+                self.model,
+                self.df_state,
+                os.path.abspath(input_path),
+                self.preview_pos.get(),
+                atten_lim_db=self.attenuation.get(),
+                duration=float(self.preview_scale.cget("to")) or None,
+                downmix=self.downmix.get()
+            )
+            duration = time.time() - proc_start
+
+            self.release_scratch()
+            self.original_audio_np = original.t().cpu().numpy()
+            self.enhanced_audio_np = to_pcm16(enhanced.t().cpu().numpy())
+            self.current_sr = self.df_state.sr()
+            self.orig_pyramid = self.build_pyramid(original)
+            self.enh_pyramid = self.build_pyramid(enhanced)
+
+            total_frames = len(self.enhanced_audio_np)
+            self.processed_frames = total_frames
+            self.timeline_scale.config(to=total_frames)
+            self.timeline_var.set(0)
+            self.horizon_bar.config(maximum=total_frames)
+            self.horizon_var.set(total_frames)
+            self.update_time_label(0, total_frames)
+            self.view_range = (0, total_frames)
+            self.root.after_idle(self.draw_overview)
+
+            start_sec = int(start)
+            self.status_text.set(f"プレビュー ({start_sec//60:02}:{start_sec%60:02} 〜) 処理時間: {duration:.1f}秒")
+            self.play_button.config(state="normal")
+            self.orig_radio.config(state="normal")
+            self.enh_radio.config(state="normal")
+            self.root.after_idle(self.start_playback)
+        except Exception as e:
+            self.status_text.set("エラー発生")
+            print(f"Error detail: {str(e)}")
+            messagebox.showerror("エラー", f"プレビュー中にエラーが発生しました：\n{str(e)}")
+        finally:
+            self.run_button.config(state="normal")
+            self.preview_button.config(state="normal")
+
     def process_audio(self, input_path):
         start_time = time.time()
+        muxer = None
         try:
+            self.use_selected_tier()
             input_path = os.path.abspath(input_path)
             base, ext = os.path.splitext(input_path)
-            output_path = base + "_enhanced.wav"
+            # 動画は音声トラックだけを処理し、映像は再エンコードせずに同じ形式で書き戻す
+            is_video = ext.lower() in VIDEO_EXTENSIONS and has_video(input_path)
+            output_path = base + "_enhanced" + (ext if is_video else ".wav")
 
             self.status_text.set("読み込み中...")
-            self.progress_var.set(5)
             self.progress_label.config(text="ファイルを準備しています...")
-            
-            temp_wav = None
-            if ext.lower() in [".m4a", ".mp3", ".mp4", ".aac"]:
-                self.status_text.set("フォーマット変換中...")
-                self.progress_var.set(10)
-                temp_wav = base + "_temp_conv.wav"
-                import subprocess
-                cmd = ["ffmpeg", "-y", "-i", input_path, temp_wav]
-                subprocess.run(cmd, check=True, capture_output=True)
-                load_path = temp_wav
-            else:
-                load_path = input_path
 
-            audio, _ = load_audio(load_path, sr=self.df_state.sr())
-            
-            if temp_wav and os.path.exists(temp_wav):
-                try:
-                    os.remove(temp_wav)
-                except:
-                    pass
+            # 前回の結果を解放し、デコード結果と強調結果はメモリマップしたスクラッチファイルに置く
+            # 全体のデコードを待たずに、ffmpeg から届いたブロックを順に強調しながらスクラッチへ書き込む
+            # （長さは ffprobe の値から見積もって確保し、足りなければ処理中に伸ばす）
+            self.release_scratch()
+            sr = self.df_state.sr()
+            info = probe_audio(input_path)
+            channels = info["channels"]
+            src_sr = info["sample_rate"] or sr
+            total_frames = max(1, int(round(info["duration"] * sr)))  # 表示・進捗用の見積もり
+            capacity = int(math.ceil(info["duration"] * sr)) + sr
+            self.original_scratch = ScratchAudio.create(capacity, channels, dir=self.scratch_dir)
+            # 強調結果は再生・保存にしか使わないので 16bit PCM で持つ（float32 の半分）
+            self.enhanced_scratch = ScratchAudio.create(capacity, channels, dtype=np.int16, dir=self.scratch_dir)
+
+            # 処理済みの先頭から再生できるように、強調結果は成長していくバッファに書き込む
+            self.processed_frames = 0
+            self.original_audio_np = self.original_scratch.array
+            self.enhanced_audio_np = self.enhanced_scratch.array
+            self.current_sr = sr
+            self.timeline_scale.config(to=total_frames)
+            self.timeline_var.set(0)
+            self.horizon_bar.config(maximum=total_frames)
+            self.horizon_var.set(0)
+            self.update_time_label(0, total_frames)
+            self.orig_pyramid = None
+            self.enh_pyramid = None
+            self.view_range = (0, total_frames)
+            orig_builder = PyramidBuilder()
+            enh_builder = PyramidBuilder()
 
             self.status_text.set("ノイズ除去中...")
-            self.progress_var.set(20)
+            self.progress_var.set(0)
             self.progress_label.config(text="AIがノイズを解析・除去しています...")
 
             atten_lim = self.attenuation.get()
             proc_start = time.time()
-            
-            enhanced = enhance(
-                self.model, 
-                self.df_state, 
-                audio, 
-                atten_lim_db=atten_lim
-            )
-            
+
+            chunk = int(autotune.chunk_seconds(STREAM_CHUNK_SECONDS, self.selected_tier(), maximum=STREAM_CHUNK_SECONDS) * sr)
+            context = int(WARMUP_SECONDS * sr)
+            if is_video:
+                muxer = VideoMuxer(input_path, output_path, sr, channels)
+            blocks = stream_decode(input_path, sr, channels, block=sr)
+            for start, enhanced_chunk, original_chunk in iter_enhance_stream(self.model, self.df_state, blocks, chunk, context,
+                                                                             atten_lim_db=atten_lim, downmix=self.downmix.get()):
+                end = start + enhanced_chunk.shape[1]
+                if end > len(self.original_scratch):
+                    # 見積もりより長かった: 余裕を持たせて伸ばす（再生中のコールバックは次の呼び出しから新しい配列を読む）
+                    grow = end + capacity // 10 + sr
+                    self.original_scratch.grow(grow)
+                    self.enhanced_scratch.grow(grow)
+                    self.original_audio_np = self.original_scratch.array
+                    self.enhanced_audio_np = self.enhanced_scratch.array
+                self.original_audio_np[start:end] = original_chunk.t().numpy()
+                self.enhanced_audio_np[start:end] = to_pcm16(enhanced_chunk.t().cpu().numpy())
+                self.processed_frames = end
+                if muxer is not None:
+                    muxer.write(enhanced_chunk)
+                # 波形表示用のピラミッドも同じパスで更新する
+                orig_builder.update(original_chunk)
+                enh_builder.update(enhanced_chunk)
+                self.orig_pyramid = orig_builder.pyramid()
+                self.enh_pyramid = enh_builder.pyramid()
+                self.root.after_idle(self.draw_overview)
+                self.progress_var.set(min(end / total_frames * 100, 100))
+                self.horizon_var.set(end)
+                elapsed = time.time() - proc_start
+                self.progress_label.config(text=f"処理中... {end / sr:.0f} / {total_frames / sr:.0f} 秒 ({end / sr / max(elapsed, 1e-6):.1f}x)")
+                if start == 0:
+                    # 最初のチャンクができた時点で再生を解禁する
+                    self.play_button.config(state="normal")
+                    self.orig_radio.config(state="normal")
+                    self.enh_radio.config(state="normal")
+
+            # 実際の長さに揃える（確保した領域の残りは使わない）
+            estimated_frames, total_frames = total_frames, self.processed_frames
+            if total_frames == 0:
+                raise RuntimeError("音声データが空です")
+            self.original_audio_np = self.original_scratch.array[:total_frames]
+            self.enhanced_audio_np = self.enhanced_scratch.array[:total_frames]
+            self.timeline_scale.config(to=total_frames)
+            self.horizon_bar.config(maximum=total_frames)
+            self.horizon_var.set(total_frames)
+            start, end = self.view_range
+            self.view_range = (min(start, total_frames - 1), total_frames if end >= estimated_frames else min(end, total_frames))
+            self.orig_pyramid = orig_builder.finalize()
+            self.enh_pyramid = enh_builder.finalize()
+            self.root.after_idle(self.draw_overview)
+
             proc_end = time.time()
             duration = proc_end - proc_start
-            
-            self.progress_var.set(90)
-            self.progress_label.config(text=f"保存中... (処理時間: {duration:.1f}秒)")
 
-            self.original_audio_np = audio.t().cpu().numpy()
-            self.enhanced_audio_np = enhanced.t().cpu().numpy()
-            self.current_sr = self.df_state.sr()
-            
-            total_frames = len(self.enhanced_audio_np)
-            self.timeline_scale.config(to=total_frames)
-            self.update_time_label(0, total_frames)
-            
-            save_audio(output_path, enhanced, sr=self.df_state.sr())
+            self.progress_label.config(text=f"保存中... (処理時間: {duration:.1f}秒)")
+            self.enhanced_scratch.array.flush()
+            if muxer is not None:
+                muxer.close()
+                muxer = None
+            elif self.keep_rate.get() and src_sr != sr:
+                # キャッシュしたポリフェーズ係数でブロックごとに元のレートへ戻しながら書き出す
+                block = 1 << 18
+                blocks = (to_float32(self.enhanced_audio_np[i:i + block]).T for i in range(0, total_frames, block))
+                with WavWriter(output_path, src_sr, channels) as w:
+                    for out in resample_stream(blocks, sr, src_sr, channels):
+                        w.write(out)
+            else:
+                save_wav_blocks(output_path, self.enhanced_audio_np, sr)
             
-            self.progress_var.set(100)
             total_elapsed = time.time() - start_time
             self.status_text.set("完了！")
             self.progress_label.config(text=f"完了！ 総処理時間: {total_elapsed:.1f}秒")
-            
-            self.play_button.config(state="normal")
-            self.orig_radio.config(state="normal")
-            self.enh_radio.config(state="normal")
             messagebox.showinfo("成功", f"ノイズ除去が完了しました：\n{output_path}")
         except Exception as e:
+            if muxer is not None:
+                muxer.abort()
             self.status_text.set("エラー発生")
             self.progress_label.config(text="エラーにより中断しました")
             print(f"Error detail: {str(e)}")
             messagebox.showerror("エラー", f"処理中にエラーが発生しました：\n{str(e)}")
         finally:
             self.run_button.config(state="normal")
+            self.preview_button.config(state="normal")
+
+    def build_pyramid(self, audio):
+        builder = PyramidBuilder()
+        builder.update(audio)
+        return builder.finalize()
+
+    # 表示範囲を画面の列数に集約して描く（サンプル数ではなくピクセル数に比例するコスト）
+    def draw_overview(self):
+        canvas = self.overview_canvas
+        canvas.delete("all")
+        width = canvas.winfo_width()
+        height = canvas.winfo_height()
+        start, end = self.view_range
+        if width < 2 or end <= start or self.orig_pyramid is None:
+            return
+
+        if self.show_spectrogram.get():
+            pyramid = self.orig_pyramid if self.play_source.get() == "original" else self.enh_pyramid
+            if pyramid is not None:
+                _, _, bands = pyramid.view(start, end, width)
+                level = np.clip((bands - FLOOR_DB) / -FLOOR_DB * 255, 0, 255).astype(np.int64)
+                rows = []
+                for k in range(bands.shape[1] - 1, -1, -1):
+                    rows.append("{" + " ".join(f"#{v:02x}{max(0, v * 2 - 255):02x}{min(255, 60 + v * 6 // 10):02x}" for v in level[:, k]) + "}")
+                image = tk.PhotoImage(width=width, height=bands.shape[1])
+                image.put(" ".join(rows))
+                self._spec_image = image.zoom(1, max(1, height // bands.shape[1]))
+                canvas.create_image(0, 0, image=self._spec_image, anchor="nw")
+        else:
+            mid = height / 2
+            xs = np.arange(width)
+            for pyramid, color in ((self.orig_pyramid, "#777777"), (self.enh_pyramid, "#4fa3ff")):
+                if pyramid is None:
+                    continue
+                mins, maxs, _ = pyramid.view(start, end, width)
+                top = np.stack([xs, mid - maxs * mid], axis=1)
+                bottom = np.stack([xs[::-1], mid - mins[::-1] * mid], axis=1)
+                canvas.create_polygon(*np.concatenate([top, bottom]).ravel().tolist(), fill=color, outline=color)
+        self.draw_playhead(self.play_ptr)
+
+    def draw_playhead(self, ptr):
+        canvas = self.overview_canvas
+        canvas.delete("playhead")
+        start, end = self.view_range
+        width = canvas.winfo_width()
+        if end > start and start <= ptr <= end:
+            x = (ptr - start) / (end - start) * width
+            canvas.create_line(x, 0, x, canvas.winfo_height(), fill="#ff4d4f", tags="playhead")
+
+    def zoom(self, factor):
+        if self.enhanced_audio_np is None:
+            return
+        total = len(self.enhanced_audio_np)
+        start, end = self.view_range
+        span = int(min(total, max(self.current_sr // 10, (end - start) * factor)))
+        start = int(min(max(0, self.play_ptr - span // 2), total - span))
+        self.view_range = (start, start + span)
+        self.draw_overview()
+
+    def zoom_all(self):
+        if self.enhanced_audio_np is not None:
+            self.view_range = (0, len(self.enhanced_audio_np))
+            self.draw_overview()
+
+    def on_overview_click(self, event):
+        start, end = self.view_range
+        if self.enhanced_audio_np is None or end <= start:
+            return
+        width = max(1, self.overview_canvas.winfo_width())
+        ptr = int(start + event.x / width * (end - start))
+        self.play_ptr = ptr
+        self.timeline_var.set(ptr)
+        self.update_time_label(ptr, len(self.enhanced_audio_np))
+        self.draw_playhead(ptr)
+
+    def release_scratch(self):
+        self.orig_pyramid = None
+        self.enh_pyramid = None
+        self.original_audio_np = None
+        self.enhanced_audio_np = None
+        for scratch in (self.original_scratch, self.enhanced_scratch):
+            if scratch is not None:
+                scratch.close()
+        self.original_scratch = None
+        self.enhanced_scratch = None
+
+    def on_close(self):
+        self.stop_playback()
+        self.release_scratch()
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+        self.root.destroy()
 
     def update_time_label(self, current_frame, total_frames):
         curr_sec = int(current_frame / self.current_sr)
@@ -251,27 +569,50 @@ class DeepFilterGUI:
         # GUI更新を制限するためのタイマー
         self.last_gui_update = 0
         
-        # キャッシュしてアクセスを高速化
-        orig_audio = self.original_audio_np
-        enh_audio = self.enhanced_audio_np
-        total_len = len(enh_audio)
+        # 全チャンネルをそのまま出力し、デバイスが対応していなければステレオ（またはモノラル）にまとめる
+        out_channels = self.enhanced_audio_np.shape[1]
+        mix = None
+        try:
+            device_channels = int(sd.query_devices(kind="output")["max_output_channels"]) or out_channels
+        except Exception:
+            device_channels = out_channels
+        if out_channels > device_channels:
+            mix = playback_mix(out_channels, min(2, device_channels))
+            out_channels = mix.shape[1]
 
         def callback(outdata, frames, time_info, status):
             if not self._is_playing:
                 raise sd.CallbackStop()
             
+            # 処理中はバッファが伸びたり、完了時に実際の長さへ切り詰められたりするので毎回読み直す
+            orig_audio = self.original_audio_np
+            enh_audio = self.enhanced_audio_np
+            if enh_audio is None:
+                raise sd.CallbackStop()
+            total_len = len(enh_audio)
             ptr = self.play_ptr
             chunk_size = min(frames, total_len - ptr)
             if chunk_size <= 0:
                 raise sd.CallbackStop()
             
+            # 処理が追いついていない位置は無音で待つ（再生位置は進めない）
+            horizon = self.processed_frames
+            if horizon < total_len:
+                chunk_size = min(chunk_size, max(0, horizon - ptr))
+                outdata[chunk_size:] = 0
+                if chunk_size == 0:
+                    return
+            
             # 選択されているソースに応じてデータをコピー
-            if self.play_source.get() == "original":
-                outdata[:chunk_size] = orig_audio[ptr:ptr+chunk_size]
+            # 16bit PCM の強調結果は出力バッファへ直接 float に変換して書く
+            source = orig_audio if self.play_source.get() == "original" else enh_audio
+            block = source[ptr:ptr+chunk_size]
+            if mix is None:
+                to_float32(block, out=outdata[:chunk_size])
             else:
-                outdata[:chunk_size] = enh_audio[ptr:ptr+chunk_size]
+                outdata[:chunk_size] = to_float32(block) @ mix
             
-            if chunk_size < frames:
+            if chunk_size < frames and ptr + chunk_size >= total_len:
                 outdata[chunk_size:] = 0
                 self.play_ptr = total_len
                 raise sd.CallbackStop()
@@ -290,7 +631,7 @@ class DeepFilterGUI:
             # blocksizeをさらに大きくして安定性を向上
             self.stream = sd.OutputStream(
                 samplerate=self.current_sr,
-                channels=enh_audio.shape[1],
+                channels=out_channels,
                 callback=callback,
                 finished_callback=self.stop_playback,
                 blocksize=4096
@@ -304,6 +645,15 @@ class DeepFilterGUI:
         if self._is_playing and not self.is_dragging:
             self.timeline_var.set(ptr)
             self.update_time_label(ptr, len(self.enhanced_audio_np))
+            # 再生位置が表示範囲の外に出たら追従する
+            start, end = self.view_range
+            if not start <= ptr <= end:
+                span = end - start
+                start = min(ptr, max(0, len(self.enhanced_audio_np) - span))
+                self.view_range = (start, start + span)
+                self.draw_overview()
+            else:
+                self.draw_playhead(ptr)
 
     def stop_playback(self):
         self._is_playing = False
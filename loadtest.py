@@ -0,0 +1,220 @@
+import os
+import csv
+import json
+import time
+import wave
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+# 負荷試験: ローカルで起動した web_enhance.py に N 個のブラウザセッションを同時に張り、
+# アップロード → Process Audio → プレイヤー表示までの時間と、サーバのメモリ使用量を記録する
+#
+#   streamlit run web_enhance.py --server.port 8501 &
+#   python loadtest.py --url http://localhost:8501 --files data/test.m4a --synthetic 30 300 \
+#       --ramp 1 2 4 --jobs-per-step 8 --server-pid $(pgrep -f "streamlit run")
+#
+# 必要なもの（アプリ本体の依存には含めない）: pip install playwright psutil && playwright install chromium
+
+PROCESS_BUTTON = "Process Audio"
+JOB_TIMEOUT = 30 * 60  # 1 ジョブの上限（秒）
+
+
+# 発話っぽい断続音 + 背景ノイズの合成 WAV を作る
+def make_synthetic(path, seconds, sr=48000):
+    rng = np.random.default_rng(int(seconds))
+    t = np.arange(int(seconds * sr)) / sr
+    voice = np.sin(2 * np.pi * 180 * t) * 0.3 * (np.sin(2 * np.pi * 0.7 * t) > 0)
+    noise = rng.normal(0, 0.05, len(t))
+    pcm = np.clip((voice + noise) * 32767, -32768, 32767).astype("<i2")
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(pcm.tobytes())
+    return path
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, int(np.ceil(q / 100 * len(values))) - 1))
+    return values[k]
+
+
+# サーバのメモリ使用量（RSS）を定期的に記録する
+# --server-pid ならプロセスと子プロセス（ffmpeg など）の合計、--container なら docker stats の値
+class RssSampler:
+    def __init__(self, pid=None, container=None, interval=1.0):
+        self.pid = pid
+        self.container = container
+        self.interval = interval
+        self.samples = []  # (経過秒, RSS バイト)
+        self._task = None
+
+    def _read(self):
+        if self.pid:
+            import psutil
+            proc = psutil.Process(self.pid)
+            procs = [proc] + proc.children(recursive=True)
+            total = 0
+            for p in procs:
+                try:
+                    total += p.memory_info().rss
+                except psutil.Error:
+                    pass
+            return total
+        if self.container:
+            out = subprocess.run(
+                ["docker", "stats", "--no-stream", "--format", "{{.MemUsage}}", self.container],
+                capture_output=True, text=True
+            ).stdout.split("/")[0].strip()
+            units = {"KiB": 2**10, "MiB": 2**20, "GiB": 2**30, "B": 1}
+            for unit, scale in units.items():
+                if out.endswith(unit):
+                    return float(out[:-len(unit)]) * scale
+        return None
+
+    async def _run(self, start):
+        while True:
+            rss = await asyncio.to_thread(self._read)
+            if rss is not None:
+                self.samples.append((time.time() - start, rss))
+            await asyncio.sleep(self.interval)
+
+    def start(self, start):
+        if self.pid or self.container:
+            self._task = asyncio.create_task(self._run(start))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def peak(self, t0, t1):
+        values = [rss for t, rss in self.samples if t0 <= t <= t1]
+        return max(values) if values else float("nan")
+
+
+# 1 セッション分: ページを開き、ファイルをアップロードして処理し、結果プレイヤーが出るまで待つ
+async def run_job(browser, url, path, timeout):
+    context = await browser.new_context()
+    page = await context.new_page()
+    start = time.time()
+    try:
+        await page.goto(url, timeout=60_000)
+        await page.locator('input[type="file"]').set_input_files(path)
+        button = page.get_by_role("button", name=PROCESS_BUTTON)
+        await button.wait_for(timeout=60_000)
+        job_start = time.time()
+        await button.click()
+        done = page.locator(".success-box")
+        error = page.locator('[data-testid="stAlert"]')
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if await done.count():
+                # 結果（プレイヤー iframe）が描画されるまでを含める
+                await page.frame_locator("iframe").first.locator("#btnDownload").wait_for(timeout=60_000)
+                return {"ok": True, "latency": time.time() - job_start, "total": time.time() - start}
+            if await error.count():
+                return {"ok": False, "latency": time.time() - job_start, "error": (await error.first.inner_text())[:200]}
+            await asyncio.sleep(0.5)
+        return {"ok": False, "latency": time.time() - job_start, "error": "timeout"}
+    except Exception as e:
+        return {"ok": False, "latency": time.time() - start, "error": str(e)[:200]}
+    finally:
+        await context.close()
+
+
+async def run_step(browser, url, files, concurrency, jobs, timeout):
+    sem = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def one(i):
+        path = files[i % len(files)]
+        async with sem:
+            t0 = time.time()
+            res = await run_job(browser, url, path, timeout)
+            res.update({"file": os.path.basename(path), "started": t0, "finished": time.time()})
+            results.append(res)
+
+    await asyncio.gather(*(one(i) for i in range(jobs)))
+    return results
+
+
+async def main_async(args):
+    from playwright.async_api import async_playwright
+
+    files = list(args.files)
+    tmpdir = tempfile.mkdtemp(prefix="clearvoice_loadtest_")
+    for seconds in args.synthetic:
+        files.append(make_synthetic(os.path.join(tmpdir, f"synthetic_{seconds:.0f}s.wav"), seconds))
+    if not files:
+        raise SystemExit("--files か --synthetic を指定してください")
+
+    t_start = time.time()
+    sampler = RssSampler(args.server_pid, args.container)
+    sampler.start(t_start)
+    rows = []
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch()
+        for concurrency in args.ramp:
+            step_t0 = time.time() - t_start
+            results = await run_step(browser, args.url, files, concurrency, args.jobs_per_step or concurrency * 2, args.timeout)
+            step_t1 = time.time() - t_start
+            ok = [r["latency"] for r in results if r["ok"]]
+            row = {
+                "concurrency": concurrency,
+                "jobs": len(results),
+                "errors": len(results) - len(ok),
+                "error_rate": (len(results) - len(ok)) / len(results),
+                "p50": percentile(ok, 50),
+                "p95": percentile(ok, 95),
+                "p99": percentile(ok, 99),
+                "throughput_per_min": len(ok) / (step_t1 - step_t0) * 60,
+                "peak_rss_mb": sampler.peak(step_t0, step_t1) / 2**20,
+            }
+            rows.append(row)
+            print(
+                f"c={concurrency:<3} jobs={row['jobs']:<3} err={row['error_rate']:.0%}  "
+                f"p50={row['p50']:.1f}s p95={row['p95']:.1f}s p99={row['p99']:.1f}s  "
+                f"{row['throughput_per_min']:.1f} jobs/min  peak RSS {row['peak_rss_mb']:.0f} MB"
+            )
+            for r in results:
+                if not r["ok"]:
+                    print(f"    ! {r['file']}: {r['error']}")
+        await browser.close()
+    await sampler.stop()
+
+    if args.out:
+        with open(args.out + ".csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        with open(args.out + "_rss.json", "w") as f:
+            json.dump([{"t": t, "rss": rss} for t, rss in sampler.samples], f)
+        print(f"Saved: {args.out}.csv, {args.out}_rss.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for web_enhance.py")
+    parser.add_argument("--url", default="http://localhost:8501")
+    parser.add_argument("--files", nargs="*", default=[], help="Audio files to upload (e.g. data/test.m4a)")
+    parser.add_argument("--synthetic", type=float, nargs="*", default=[], help="Also generate synthetic WAVs of these lengths (seconds)")
+    parser.add_argument("--ramp", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrency levels to step through")
+    parser.add_argument("--jobs-per-step", type=int, default=0, help="Jobs per concurrency level (default: 2x concurrency)")
+    parser.add_argument("--timeout", type=float, default=JOB_TIMEOUT)
+    parser.add_argument("--server-pid", type=int, help="PID of the streamlit process to sample RSS from")
+    parser.add_argument("--container", help="Docker container name to sample memory from instead")
+    parser.add_argument("--out", help="Write <out>.csv summary and <out>_rss.json timeline")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import time
+import threading
+import torch
+import autotune
+from df.enhance import enhance, init_df
+
+WARMUP_SECONDS = 3.0  # ダミー推論に使う無音＋ノイズの長さ
+
+# 速度/品質の段階 -> DeepFilterNet の学習済みモデル
+# fast は DeepFilterNet2（DeepFilterNet3 より計算量が小さく、数倍速く処理できる）
+TIERS = {
+    "quality": {"model": "DeepFilterNet3", "label": "高品質"},
+    "fast": {"model": "DeepFilterNet2", "label": "高速"},
+}
+DEFAULT_TIER = "quality"
+
+_lock = threading.Lock()
+_ready = threading.Event()
+_models = {}    # tier -> (model, df_state)
+_realtime = {}  # tier -> ウォームアップで計測した実時間比
+_prewarm_error = None
+_first_request_logged = False
+
+
+def _log(message):
+    print(f"[model] {message}", flush=True)
+
+
+# 段階ごとにモデルを初めて使うときに一度だけ読み込む（同じプロセス内の Streamlit スクリプトとも共有される）
+def get_model(tier=DEFAULT_TIER):
+    if tier not in TIERS:
+        raise ValueError(f"不明な処理モードです: {tier}")
+    with _lock:
+        if tier not in _models:
+            start = time.time()
+            model, df_state, _ = init_df(model_base_dir=TIERS[tier]["model"])
+            _models[tier] = (model, df_state)
+            _log(f"{TIERS[tier]['model']} ({tier}) loaded in {time.time() - start:.2f}s")
+            profile = autotune.apply()
+            if profile and "threads" in profile:
+                tuned = [t for t in TIERS if autotune.is_tuned(t, profile)]
+                _log(f"tuning profile: threads={profile['threads']}, chunk sizes tuned for {', '.join(tuned) or 'none'}")
+        return _models[tier]
+
+
+# 実時間比（何倍速で処理できるか）: このプロセスで計測した値、なければ benchmark.py tiers の結果
+def realtime_factor(tier):
+    if tier in _realtime:
+        return _realtime[tier]
+    return autotune.tier_realtime(tier)
+
+
+# 選択肢に表示する名前（実時間比が分かっていれば併記する）
+def tier_label(tier):
+    info = TIERS[tier]
+    rtf = realtime_factor(tier)
+    speed = f" — 約{rtf:.0f}倍速" if rtf else ""
+    return f"{info['label']} ({info['model']}){speed}"
+
+
+# 代表的な長さのダミー推論を 2 回行い、初回（コールド）と 2 回目（ウォーム）の時間を記録する
+# 初回はアロケータやカーネルの初期化コストを含むので、ここで払っておけば最初の利用者が待たされない
+def warm_up(model, df_state, seconds=WARMUP_SECONDS, tier=DEFAULT_TIER):
+    audio = torch.randn(1, int(seconds * df_state.sr())) * 0.01
+    timings = []
+    for _ in range(2):
+        start = time.time()
+        enhance(model, df_state, audio)
+        timings.append(time.time() - start)
+    _realtime[tier] = seconds / max(timings[1], 1e-6)
+    _log(f"warm-up inference ({tier}, {seconds:.0f}s audio): cold {timings[0]:.2f}s, warm {timings[1]:.2f}s")
+    return timings
+
+
+# 既定の段階だけを起動時に温める（他の段階は選ばれたときに読み込む）
+# 失敗した場合は準備完了にせず、例外を prewarm_error() で返す
+def prewarm():
+    global _prewarm_error
+    try:
+        model, df_state = get_model()
+        warm_up(model, df_state)
+        if autotune.AUTOTUNE_ON_START and not autotune.is_tuned(DEFAULT_TIER):
+            autotune.tune(model, df_state, DEFAULT_TIER)
+    except Exception as e:
+        _prewarm_error = e
+        _log(f"prewarm failed: {e!r}")
+        return
+    _ready.set()
+
+
+# 起動直後にバックグラウンドで読み込み・ウォームアップを始める
+def start_prewarm():
+    thread = threading.Thread(target=prewarm, name="model-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def prewarm_error():
+    return _prewarm_error
+
+
+# 最初の実リクエストの推論時間をログに残す（プリウォームの効果確認用）
+def record_inference(seconds, audio_seconds):
+    global _first_request_logged
+    if _first_request_logged:
+        return
+    _first_request_logged = True
+    state = "prewarmed" if is_ready() else "cold"
+    _log(f"first request on this instance ({state}): {seconds:.2f}s for {audio_seconds:.1f}s audio")
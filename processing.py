@@ -0,0 +1,79 @@
+import itertools
+import torch
+from df.enhance import enhance
+from audio_io import decode_segment
+
+# プレビューの既定値（秒）
+PREVIEW_SECONDS = 10.0
+WARMUP_SECONDS = 1.0
+
+
+# 区間 [start, start + length) の前に warm-up 分の文脈を付けて強調し、文脈部分を捨てる
+# モデルの再帰状態が収束してからの出力だけを使うので、全体処理と聴感上ほぼ同じ結果になる
+# audio は [channels, samples] のテンソルのほか、メモリマップの転置ビューなど numpy 配列でもよい
+# 全チャンネルを 1 つのバッチとして 1 回の forward で処理する（チャンネルごとにモデルを回さない）
+# downmix=True ならモノラルにまとめて 1 チャンネル分だけ処理し、元のチャンネル数に複製する（速度優先）
+def enhance_window(model, df_state, audio, start, length, context, atten_lim_db=None, downmix=False):
+    ctx_start = max(0, start - context)
+    end = min(audio.shape[1], start + length)
+    chunk = torch.as_tensor(audio[:, ctx_start:end])
+    channels = chunk.shape[0]
+    if downmix and channels > 1:
+        chunk = chunk.mean(dim=0, keepdim=True)
+    enhanced = enhance(model, df_state, chunk.contiguous(), atten_lim_db=atten_lim_db)
+    if enhanced.shape[0] != channels:
+        enhanced = enhanced.repeat(channels, 1)
+    return enhanced[:, start - ctx_start:]
+
+
+# ファイルの指定位置の周辺だけをデコードして強調する（全体を読み込まない）
+# 戻り値: (元音声, 強調後音声, 実際の開始秒)
+def preview_file(model, df_state, path, center, length=PREVIEW_SECONDS,
+                 warmup=WARMUP_SECONDS, atten_lim_db=None, duration=None, downmix=False):
+    sr = df_state.sr()
+    start = max(0.0, center - length / 2)
+    if duration is not None:
+        start = max(0.0, min(start, duration - length))
+    ctx_start = max(0.0, start - warmup)
+    audio = decode_segment(path, sr, start=ctx_start, duration=length + (start - ctx_start))
+    context = int(round((start - ctx_start) * sr))
+    enhanced = enhance_window(model, df_state, audio, context, audio.shape[1], context,
+                              atten_lim_db=atten_lim_db, downmix=downmix)
+    return audio[:, context:], enhanced, start
+
+
+# 音声を chunk サンプルずつ強調して (開始位置, 強調後チャンク) を順に返す
+# 各チャンクには直前 context サンプルの文脈を付けるので、境界で音質が途切れない
+# first を指定するとその位置から処理を再開する
+def iter_enhance(model, df_state, audio, chunk, context=0, atten_lim_db=None, first=0, downmix=False):
+    total = audio.shape[1]
+    for start in range(first, total, chunk):
+        yield start, enhance_window(model, df_state, audio, start, chunk, context, atten_lim_db=atten_lim_db, downmix=downmix)
+
+
+# iter_enhance のストリーム版: デコード中のブロック列を受け取り、chunk ごとに強調して
+# (開始位置, 強調後チャンク, 元チャンク) を返す。直前 context サンプルだけを保持するので
+# 全体をメモリに載せずに iter_enhance と同じ結果が得られる
+# first より前のチャンク（チェックポイントから再開する場合の処理済み区間）は強調せず None を返す
+def iter_enhance_stream(model, df_state, blocks, chunk, context=0, atten_lim_db=None, downmix=False, first=0):
+    history = None
+    pending, n_pending = [], 0
+    start = 0
+    for block in itertools.chain(blocks, [None]):
+        if block is not None:
+            pending.append(block)
+            n_pending += block.shape[1]
+        while n_pending and (n_pending >= chunk or block is None):
+            buf = torch.cat(pending, dim=1) if len(pending) > 1 else pending[0]
+            data = buf[:, :chunk]
+            pending = [buf[:, chunk:]] if buf.shape[1] > chunk else []
+            n_pending = buf.shape[1] - data.shape[1]
+            window = data if history is None else torch.cat([history, data], dim=1)
+            ctx = window.shape[1] - data.shape[1]
+            enhanced = None
+            if start >= first:
+                enhanced = enhance_window(model, df_state, window, ctx, data.shape[1], ctx,
+                                          atten_lim_db=atten_lim_db, downmix=downmix)
+            yield start, enhanced, data
+            history = window[:, -context:] if context else None
+            start += data.shape[1]
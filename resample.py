@@ -0,0 +1,104 @@
+import math
+from functools import lru_cache
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import torch
+
+HALF_TAPS = 16      # 1 出力あたり片側で参照する入力サンプル数
+KAISER_BETA = 8.0
+ROLLOFF = 0.94      # ナイキスト周波数に対する遮断周波数の比
+RENDER_BLOCK = 1 << 14  # 一度に計算する出力サンプル数（[channels, n, 2 * HALF_TAPS + 1] の一時配列を小さく保つ）
+
+
+# (元レート, 目標レート) ごとのポリフェーズ係数を作ってキャッシュする
+# 戻り値: (L, M, kernel) で kernel[r, o + HALF_TAPS] は位相 r で入力オフセット o に掛ける係数
+@lru_cache(maxsize=16)
+def polyphase_kernel(src, dst, half_taps=HALF_TAPS):
+    g = math.gcd(src, dst)
+    up, down = dst // g, src // g
+    # アップサンプル後のレートで見た遮断周波数（正規化）。ゼロ挿入の分だけ利得を up 倍する
+    cutoff = ROLLOFF * min(1.0, up / down) / up
+    n = np.arange(-half_taps * up, half_taps * up + 1)
+    h = up * cutoff * np.sinc(cutoff * n) * np.kaiser(len(n), KAISER_BETA)
+    offsets = np.arange(-half_taps, half_taps + 1)
+    idx = np.arange(up)[:, None] - offsets[None, :] * up + half_taps * up
+    valid = (idx >= 0) & (idx < len(h))
+    kernel = np.where(valid, h[np.clip(idx, 0, len(h) - 1)], 0.0).astype(np.float32)
+    return up, down, kernel
+
+
+# ブロック単位で任意の整数比レート変換を行う（前後 HALF_TAPS サンプルだけを保持）
+# 同じレートの組み合わせなら係数はキャッシュを使うので、生成コストは最初の 1 回だけ
+class StreamResampler:
+    def __init__(self, src, dst, channels, half_taps=HALF_TAPS):
+        self.src = src
+        self.dst = dst
+        self.half_taps = half_taps
+        self.up, self.down, self.kernel = polyphase_kernel(src, dst, half_taps)
+        self._buf = np.zeros((channels, half_taps), dtype=np.float32)  # 先頭は無音で埋める
+        self._buf_start = -half_taps  # _buf[:, 0] の入力上の位置
+        self._n_in = 0
+        self._n_out = 0
+
+    # block: [channels, frames] を渡し、変換できた分の [channels, frames'] を返す
+    def process(self, block):
+        if self.src == self.dst:
+            return torch.as_tensor(block)
+        block = np.asarray(block, dtype=np.float32)
+        self._buf = np.concatenate([self._buf, block], axis=1)
+        self._n_in += block.shape[1]
+        # 右側 half_taps サンプルが揃っている出力まで計算する
+        last_q = self._n_in - 1 - self.half_taps
+        k_end = (last_q * self.up) // self.down + 1 if last_q >= 0 else 0
+        return torch.from_numpy(self._render(k_end))
+
+    # 残りの入力を無音で補って出力を締めくくる
+    def flush(self):
+        if self.src == self.dst:
+            return torch.zeros((self._buf.shape[0], 0))
+        pad = np.zeros((self._buf.shape[0], self.half_taps + 1), dtype=np.float32)
+        self._buf = np.concatenate([self._buf, pad], axis=1)
+        k_end = -(-self._n_in * self.up // self.down)
+        return torch.from_numpy(self._render(k_end))
+
+    def _render(self, k_end):
+        ks = np.arange(self._n_out, max(self._n_out, k_end))
+        if len(ks) == 0:
+            return np.zeros((self._buf.shape[0], 0), dtype=np.float32)
+        windows = sliding_window_view(self._buf, 2 * self.half_taps + 1, axis=1)
+        out = np.empty((self._buf.shape[0], len(ks)), dtype=np.float32)
+        # 窓の取り出しはコピーになるので、出力を区切って一時配列の大きさを抑える
+        for i in range(0, len(ks), RENDER_BLOCK):
+            k = ks[i:i + RENDER_BLOCK]
+            q = k * self.down // self.up
+            r = k * self.down % self.up
+            out[:, i:i + len(k)] = np.einsum("cko,ko->ck", windows[:, q - self.half_taps - self._buf_start], self.kernel[r])
+        self._n_out = int(ks[-1]) + 1
+        # 次の出力で必要になる位置より前は捨てる
+        keep = self._n_out * self.down // self.up - self.half_taps - self._buf_start
+        if keep > 0:
+            self._buf = self._buf[:, keep:]
+            self._buf_start += keep
+        return out
+
+
+# テンソル全体を一度に変換する（内部はストリーム版と同じく約 1 秒ずつ処理し、一時メモリを抑える）
+def resample(audio, src, dst):
+    if src == dst:
+        return audio
+    rs = StreamResampler(src, dst, audio.shape[0])
+    parts = [rs.process(audio[:, i:i + src]) for i in range(0, audio.shape[1], src)]
+    return torch.cat(parts + [rs.flush()], dim=1)
+
+
+# ブロック列をそのままレート変換したブロック列にする（ストリーム処理用）
+def resample_stream(blocks, src, dst, channels):
+    if src == dst:
+        yield from blocks
+        return
+    rs = StreamResampler(src, dst, channels)
+    for block in blocks:
+        out = rs.process(block)
+        if out.shape[1]:
+            yield out
+    yield rs.flush()
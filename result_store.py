@@ -0,0 +1,169 @@
+import os
+import time
+import shutil
+import pickle
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+# 処理結果（WAV/MP3 のバイト列など）をプロセス全体で預かるストア
+# セッションごとに無期限で持たせるとアイドルなタブがメモリを占有し続けるため、
+#   - 全体のメモリ予算を超えたら最近使われていないものからディスクへ退避
+#   - ディスク予算も超えたら破棄（利用者には再処理を促す）
+#   - 最後のアクセスから TTL を過ぎたものは破棄
+# を行う
+# Cloud Run の /tmp はメモリ上にあり退避してもメモリは減らないので、退避は
+# CLEARVOICE_RESULT_SPILL_DIR に実ストレージ（マウントしたボリュームなど）を指定したときだけ行う。
+# 指定がなければディスク予算は 0 で、メモリ予算を超えた結果は破棄する
+# 結果に付随するファイル（静的配信する動画など）は files で登録すると、その大きさも予算に数え、
+# 結果が破棄・期限切れになったときに一緒に削除する（退避してもメモリは減らないので退避はせず破棄する）
+RESULT_BUDGET_MB = int(os.environ.get("CLEARVOICE_RESULT_BUDGET_MB", "512"))
+RESULT_SPILL_DIR = os.environ.get("CLEARVOICE_RESULT_SPILL_DIR") or None
+RESULT_DISK_BUDGET_MB = int(os.environ.get("CLEARVOICE_RESULT_DISK_BUDGET_MB", "4096" if RESULT_SPILL_DIR else "0"))
+RESULT_TTL = int(os.environ.get("CLEARVOICE_RESULT_TTL", str(30 * 60)))
+
+
+def _size(obj):
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(_size(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_size(v) for v in obj)
+    return 64
+
+
+def _disk_usage(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def _delete_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ResultStore:
+    def __init__(self, budget=RESULT_BUDGET_MB * 2**20, disk_budget=RESULT_DISK_BUDGET_MB * 2**20,
+                 ttl=RESULT_TTL, spill_dir=RESULT_SPILL_DIR):
+        self.budget = budget
+        self.disk_budget = disk_budget
+        self.ttl = ttl
+        self.spill_dir = None
+        if disk_budget > 0:
+            if spill_dir:
+                os.makedirs(spill_dir, exist_ok=True)
+            self.spill_dir = tempfile.mkdtemp(prefix="clearvoice_results_", dir=spill_dir)
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (value, size)。末尾ほど最近使われた
+        self._disk = {}               # key -> (path, size)
+        self._access = {}             # key -> 最終アクセス時刻
+        self._files = {}              # key -> 付随するファイル・ディレクトリのパス
+        self.counters = {"spills": 0, "drops": 0, "expired": 0, "disk_hits": 0}
+
+    def put(self, key, value, files=()):
+        with self._lock:
+            self._remove(key)
+            files = list(files)
+            self._memory[key] = (value, _size(value) + sum(_disk_usage(p) for p in files))
+            self._access[key] = time.time()
+            if files:
+                self._files[key] = files
+            self._expire()
+            self._enforce()
+
+    # 見つからなければ None（期限切れ・破棄済みの場合は呼び出し側で再処理を促す）
+    def get(self, key):
+        with self._lock:
+            self._expire()
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._access[key] = time.time()
+                # 付随ファイルの更新時刻も進める（ストアを通さない掃除が使用中のファイルを消さないように）
+                for path in self._files.get(key, ()):
+                    try:
+                        os.utime(path)
+                    except OSError:
+                        pass
+                return self._memory[key][0]
+            if key in self._disk:
+                path, size = self._disk.pop(key)
+                with open(path, "rb") as f:
+                    value = pickle.load(f)
+                os.remove(path)
+                self._memory[key] = (value, size)
+                self._access[key] = time.time()
+                self.counters["disk_hits"] += 1
+                self._enforce()
+                return value
+            return None
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries_memory": len(self._memory),
+                "entries_disk": len(self._disk),
+                "bytes_memory": sum(size for _, size in self._memory.values()),
+                "bytes_disk": sum(size for _, size in self._disk.values()),
+                "entries_files": len(self._files),
+                **self.counters,
+            }
+
+    def _remove(self, key):
+        self._memory.pop(key, None)
+        self._access.pop(key, None)
+        for path in self._files.pop(key, ()):
+            _delete_path(path)
+        entry = self._disk.pop(key, None)
+        if entry:
+            try:
+                os.remove(entry[0])
+            except OSError:
+                pass
+
+    def _expire(self):
+        now = time.time()
+        for key, t in list(self._access.items()):
+            if now - t > self.ttl:
+                self._remove(key)
+                self.counters["expired"] += 1
+
+    # メモリ予算を超えた分を LRU 順にディスクへ退避し、ディスク予算も超えたら古いものから破棄
+    def _enforce(self):
+        mem = sum(size for _, size in self._memory.values())
+        while mem > self.budget and len(self._memory) > 1:
+            key, (value, size) = self._memory.popitem(last=False)
+            mem -= size
+            if self.spill_dir and size <= self.disk_budget and key not in self._files:
+                path = os.path.join(self.spill_dir, hashlib.sha1(key.encode()).hexdigest() + ".pkl")
+                with open(path, "wb") as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                self._disk[key] = (path, size)
+                self.counters["spills"] += 1
+            else:
+                self._remove(key)
+                self.counters["drops"] += 1
+        disk = sum(size for _, size in self._disk.values())
+        while disk > self.disk_budget and self._disk:
+            key = min(self._disk, key=lambda k: self._access.get(k, 0))
+            disk -= self._disk[key][1]
+            self._remove(key)
+            self.counters["drops"] += 1
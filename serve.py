@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+import model_service
+
+# コンテナのエントリポイント
+# モデルの読み込みとダミー推論をバックグラウンドで始め、その間に Streamlit を import する。
+# ウォームアップが終わるまでポートを開かないので、Cloud Run の起動プローブ
+# (/_stcore/health) が通った時点で最初の利用者も温まったモデルで処理される。
+# 同じプロセスで web_enhance.py が動くため、読み込んだモデルはそのまま共有される。
+
+
+def main():
+    start = time.time()
+    prewarm = model_service.start_prewarm()
+
+    from streamlit.web import bootstrap
+
+    prewarm.join()
+    # モデルを用意できなかったインスタンスにはトラフィックを流さない（待ち受けを始めずに異常終了する）
+    if not model_service.is_ready():
+        print(f"[serve] model prewarm failed: {model_service.prewarm_error()!r}", flush=True)
+        sys.exit(1)
+    print(f"[serve] ready in {time.time() - start:.2f}s", flush=True)
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "web_enhance.py")
+    # 処理結果（WAV・MP3・動画）は static/results から配信する
+    os.makedirs(os.path.join(os.path.dirname(script), "static", "results"), exist_ok=True)
+    flag_options = {
+        "server.port": int(os.environ.get("PORT", "8080")),
+        "server.address": "0.0.0.0",
+        "server.enableStaticServing": True,
+    }
+    bootstrap.load_config_options(flag_options=flag_options)
+    bootstrap.run(script, False, sys.argv[1:], flag_options)
+
+
+if __name__ == "__main__":
+    main()
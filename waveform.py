@@ -0,0 +1,162 @@
+import base64
+import numpy as np
+
+BLOCK = 1024      # 最下層の 1 列が表すサンプル数
+N_BANDS = 24      # スペクトログラム表示の帯域数（対数間隔）
+FLOOR_DB = -100.0  # 帯域エネルギーの下限 (dBFS)
+
+
+# rfft のビンを対数間隔の帯域に分ける境界（DC は除く）
+def _band_edges(block, n_bands):
+    n_bins = block // 2 + 1
+    edges = np.unique(np.geomspace(1, n_bins, n_bands + 1).astype(np.int64))
+    edges[-1] = n_bins
+    return edges
+
+
+# 1 レベル上（列数が半分）の min/max/帯域エネルギーを作る
+def _reduce_level(mins, maxs, bands):
+    if len(mins) % 2:
+        mins = np.append(mins, mins[-1:])
+        maxs = np.append(maxs, maxs[-1:])
+        bands = np.concatenate([bands, bands[-1:]])
+    return (
+        mins.reshape(-1, 2).min(axis=1),
+        maxs.reshape(-1, 2).max(axis=1),
+        bands.reshape(-1, 2, bands.shape[1]).astype(np.float32).mean(axis=1).astype(np.float16),
+    )
+
+
+def _b64(array):
+    return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode()
+
+
+# 多解像度の min/max・帯域エネルギーのピラミッド
+# levels[k] は BLOCK << k サンプルを 1 列にまとめたもの。表示は列数に比例するコストで済む
+class WaveformPyramid:
+    def __init__(self, mins, maxs, bands, block, frames):
+        self.block = block
+        self.frames = frames
+        self.levels = [(mins, maxs, bands)]
+        while len(self.levels[-1][0]) > 1:
+            self.levels.append(_reduce_level(*self.levels[-1]))
+
+    @property
+    def n_bands(self):
+        return self.levels[0][2].shape[1]
+
+    # [start, end) サンプルの範囲を width 列に集約して (min, max, 帯域 dB) を返す
+    # 1 列あたり 1 ブロック以上になる最も粗いレベルを使うので、走査する列数は高々 2 * width
+    def view(self, start, end, width):
+        span = max(1, end - start)
+        level = 0
+        while level + 1 < len(self.levels) and span >= width * (self.block << (level + 1)):
+            level += 1
+        blk = self.block << level
+        mins, maxs, bands = self.levels[level]
+        n = len(mins)
+
+        out_min = np.zeros(width, dtype=np.float32)
+        out_max = np.zeros(width, dtype=np.float32)
+        out_bands = np.full((width, self.n_bands), FLOOR_DB, dtype=np.float32)
+        pos = (start + span * np.arange(width + 1) / width) / blk
+        lo = np.floor(pos[:-1]).astype(np.int64)
+        valid = (lo >= 0) & (lo < n)
+        idx = lo[valid]
+        if len(idx) == 0:
+            return out_min, out_max, out_bands
+
+        if pos[1] - pos[0] < 1:
+            # ブロックより細かいズームでは該当ブロックをそのまま並べる
+            out_min[valid] = mins[idx]
+            out_max[valid] = maxs[idx]
+            out_bands[valid] = bands[idx]
+        else:
+            stop = min(n, int(np.ceil(pos[-1])))
+            counts = np.diff(np.append(idx, stop))
+            out_min[valid] = np.minimum.reduceat(mins[:stop], idx)
+            out_max[valid] = np.maximum.reduceat(maxs[:stop], idx)
+            out_bands[valid] = np.add.reduceat(bands[:stop].astype(np.float32), idx, axis=0) / counts[:, None]
+        return out_min, out_max, out_bands
+
+    # Web プレイヤー向けに、列数が max_columns 以下のレベルだけを量子化して書き出す
+    def export(self, max_columns=1 << 15, band_columns=1 << 11):
+        levels = []
+        band_level = None
+        for k, (mins, maxs, bands) in enumerate(self.levels):
+            if len(mins) <= max_columns:
+                levels.append({
+                    "block": self.block << k,
+                    "min": _b64(np.clip(np.round(mins.astype(np.float32) * 127), -127, 127).astype(np.int8)),
+                    "max": _b64(np.clip(np.round(maxs.astype(np.float32) * 127), -127, 127).astype(np.int8)),
+                })
+            if band_level is None and len(mins) <= band_columns:
+                band_level = k
+        _, _, bands = self.levels[band_level]
+        q = np.clip((bands.astype(np.float32) - FLOOR_DB) / -FLOOR_DB * 255, 0, 255).astype(np.uint8)
+        return {
+            "frames": self.frames,
+            "levels": levels,
+            "bands": {"block": self.block << band_level, "n": self.n_bands, "data": _b64(q)},
+        }
+
+
+# 強調処理のチャンクを受け取りながらピラミッドの最下層を 1 パスで作る
+class PyramidBuilder:
+    def __init__(self, block=BLOCK, n_bands=N_BANDS):
+        self.block = block
+        self.frames = 0
+        self._edges = _band_edges(block, n_bands)
+        self._window = np.hanning(block).astype(np.float32)
+        self._norm = float(self._window.sum()) ** 2
+        self._tail = np.zeros((3, 0), dtype=np.float32)
+        self._mins, self._maxs, self._bands = [], [], []
+
+    # chunk: [channels, samples]（テンソルまたは numpy 配列）
+    def update(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if chunk.ndim == 1:
+            chunk = chunk[None]
+        self.frames += chunk.shape[1]
+        data = np.stack([chunk.min(axis=0), chunk.max(axis=0), chunk.mean(axis=0)])
+        if self._tail.shape[1]:
+            data = np.concatenate([self._tail, data], axis=1)
+        n = data.shape[1] // self.block * self.block
+        self._tail = data[:, n:].copy()
+        if n:
+            self._add_blocks(data[:, :n])
+
+    def _add_blocks(self, data):
+        blocks = data.reshape(3, -1, self.block)
+        self._mins.append(blocks[0].min(axis=1).astype(np.float16))
+        self._maxs.append(blocks[1].max(axis=1).astype(np.float16))
+        power = np.abs(np.fft.rfft(blocks[2] * self._window, axis=1)) ** 2 / self._norm
+        widths = np.diff(self._edges)
+        bands = np.add.reduceat(power[:, :self._edges[-1]], self._edges[:-1], axis=1) / widths
+        self._bands.append(np.maximum(10 * np.log10(bands + 1e-12), FLOOR_DB).astype(np.float16))
+
+    # ここまでに完成したブロックだけでピラミッドを作る（処理途中の表示用）
+    def pyramid(self):
+        if not self._mins:
+            return None
+        mins = np.concatenate(self._mins)
+        maxs = np.concatenate(self._maxs)
+        bands = np.concatenate(self._bands)
+        self._mins, self._maxs, self._bands = [mins], [maxs], [bands]
+        return WaveformPyramid(mins, maxs, bands, self.block, len(mins) * self.block)
+
+    # 端数のブロックも含めて確定する
+    def finalize(self):
+        rest = self._tail.shape[1]
+        if rest:
+            pad = self.block - rest
+            tail = np.concatenate([
+                np.pad(self._tail[:2], ((0, 0), (0, pad)), mode="edge"),
+                np.pad(self._tail[2:], ((0, 0), (0, pad))),
+            ])
+            self._tail = np.zeros((3, 0), dtype=np.float32)
+            self._add_blocks(tail)
+        pyramid = self.pyramid()
+        if pyramid is not None:
+            pyramid.frames = self.frames
+        return pyramid
@@ -1,20 +1,61 @@
 import os
 import streamlit as st
-import torch
 import torchaudio
 import numpy as np
 import time
 import tempfile
+import html
+import shutil
 import subprocess
 import threading
 import base64
-from df.enhance import enhance, init_df, load_audio, save_audio
+import json
+import uuid
+from urllib.parse import quote
+from audio_io import VIDEO_EXTENSIONS, VideoMuxer, WavWriter, estimate_muxed_size, has_video, ingest_upload, probe_audio, stream_decode, to_wav_bytes
+from processing import PREVIEW_SECONDS, WARMUP_SECONDS, iter_enhance_stream, preview_file
+from waveform import PyramidBuilder
+from resample import StreamResampler
+import autotune
+import checkpoint
+import model_service
+from result_store import RESULT_TTL, ResultStore
 
-# モデルの初期化
+# アップロードの上限（Cloud Run のメモリ・処理時間に合わせて環境変数で調整）
+# Streamlit の静的ファイル配信はこれより大きいファイルを返さない (404)
+STATIC_MAX_MB = 200
+MAX_UPLOAD_MB = int(os.environ.get("CLEARVOICE_MAX_UPLOAD_MB", "200"))
+# 結果の WAV も静的配信するので、既定の長さの上限は 48kHz モノラル 16bit の WAV が STATIC_MAX_MB に収まる長さ（36 分）
+# ステレオや元のサンプルレートでの書き出しで収まらない場合は処理の開始時に断る
+MAX_DURATION_MIN = int(os.environ.get("CLEARVOICE_MAX_DURATION_MIN", str(STATIC_MAX_MB * 2**20 // (48000 * 2 * 60))))
+# アップロードの一時ファイル置き場。最後に触れてから UPLOAD_TTL を過ぎたセッションのものは削除する
+UPLOAD_DIR = os.path.join(tempfile.gettempdir(), "clearvoice_uploads")
+UPLOAD_TTL = int(os.environ.get("CLEARVOICE_UPLOAD_TTL", str(30 * 60)))
+# 処理結果（WAV・MP3・動画）は大きいのでバイト列としてメモリに持たず、Streamlit の静的ファイル配信
+# (server.enableStaticServing) でこのディレクトリから直接再生・ダウンロードさせる
+RESULT_FILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "results")
+
+# モデルの初期化（serve.py から起動した場合は起動時に読み込み・ウォームアップ済みのものを使う）
+# 既定以外の処理モードは選ばれたときに読み込み、以後は使い回す
+@st.cache_resource
+def get_model(tier=model_service.DEFAULT_TIER):
+    return model_service.get_model(tier)
+
+# 処理結果はセッションではなくプロセス共通のストアに置く（メモリ予算・TTL・LRU 退避）
 @st.cache_resource
-def get_model():
-    model, df_state, _ = init_df()
-    return model, df_state
+def get_result_store():
+    return ResultStore()
+
+def result_key(kind):
+    if 'session_key' not in st.session_state:
+        st.session_state['session_key'] = uuid.uuid4().hex
+    return f"{st.session_state['session_key']}:{kind}"
+
+# files: 結果に付随するファイル（予算に数え、結果が破棄されたら一緒に削除される）
+def put_result(kind, value, files=()):
+    store = get_result_store()
+    store.put(result_key(kind), value, files=files)
+    print(f"[result_store] {json.dumps(store.stats())}")
 
 # ページ設定
 st.set_page_config(
@@ -34,16 +75,31 @@ T = {
     'version': 'v0.1.0-beta',
     'subtitle': 'AIノイズ処理ライブラリDeepFilterNetを使ったノイズ処理Webアプリ',
     'step1': '1. 音源をアップロード',
-    'uploader_label': 'WAV, M4A, MP3, AAC ファイルを選択してください',
+    'uploader_label': 'WAV, M4A, MP3, AAC または MP4, MOV, MKV 動画ファイルを選択してください',
     'step2': '2. 除去強度の設定',
     'step2_hint': '※わからなければ初期設定のままで良いです',
+    'tier_label': '処理モード',
+    'tier_help': '高速モードは軽量なモデル (DeepFilterNet2) で処理します。倍速の表示は実時間に対する処理速度の目安です。',
     'atten_label': 'ノイズ除去の制限 (dB)',
     'atten_help': '0dBに近いほど強力にノイズを消します。声が不自然な場合のみ値を大きくしてください。',
+    'keep_rate_label': '元のサンプルレートで書き出す',
+    'keep_rate_help': 'オフの場合は 48kHz で書き出します（処理は常に 48kHz で行います）。',
+    'downmix_label': '高速モード（ステレオ等をモノラルにまとめて処理）',
+    'downmix_help': '全チャンネルをモノラルにまとめて 1 チャンネル分だけ処理し、各チャンネルに書き戻します。ステレオの広がりは失われます。',
     'btn_enhance': 'Process Audio',
+    'preview_label': 'プレビュー位置 (秒)',
+    'preview_help': '指定位置を中心とした {length:.0f} 秒間だけを処理して試聴できます。設定が決まったら全体を処理してください。',
+    'btn_preview': 'Preview',
+    'status_preview': 'プレビューを生成中...',
+    'preview_title': 'プレビュー ({start} 〜)',
     'status_preparing': '音声を準備中...',
     'status_processing': 'AIがノイズを解析・除去しています...',
     'status_saving': '結果を生成中...',
     'status_done': 'Done! {duration:.1f}s',
+    'status_resume': '前回中断した処理を {percent:.0f}% から再開します',
+    'wav_too_large': '処理結果の WAV ({size:.0f} MB) が配信できる大きさ ({limit} MB) を超えます。短いファイルに分けるか、元のサンプルレートでの書き出しをオフにしてください。',
+    'video_too_large': '処理後の動画が配信できる大きさ ({limit} MB) を超えるため、動画は書き出さずに音声のみを処理します。',
+    'result_expired': '処理結果の保持期限が切れたため破棄されました。もう一度「Process Audio」を押すと再生成します。',
     'step3': '3. 処理結果',
     'success_msg': 'Success  \n{duration:.1f}s',
     'input_label': '元の音源',
@@ -51,6 +107,7 @@ T = {
     'btn_download': 'Download',
     'dl_wav': 'WAV',
     'dl_mp3': 'MP3',
+    'dl_video': '動画をダウンロード（音声のみ処理・映像は無劣化）',
     'info_msg': 'ファイルをアップロードして「クリアな音声を生成する」をクリックしてください。',
     'powered_by': 'Powered by',
 }
@@ -310,6 +367,436 @@ st.markdown(f"""
     </a>
 """, unsafe_allow_html=True)
 
+# アップロードをセッション単位の一時ファイルにブロック単位で書き出す（プレビューのたびに書き直さない）
+# 放置されたセッション（タブを閉じた・離席した）のアップロードを削除する
+# Cloud Run の /tmp はメモリ上にあるので、残しておくとその分のメモリを使い続ける
+def cleanup_uploads():
+    if not os.path.isdir(UPLOAD_DIR):
+        return
+    now = time.time()
+    for name in os.listdir(UPLOAD_DIR):
+        path = os.path.join(UPLOAD_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > UPLOAD_TTL:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+# 結果の保持期間を過ぎた結果ファイルを削除する
+# ストアに残っている結果のファイルはアクセスのたびに更新時刻が進むので消えない。
+# ここで消えるのはストアから外れずに残ったもの（中断した処理やプロセスの再起動前の結果）
+def cleanup_result_files():
+    if not os.path.isdir(RESULT_FILE_DIR):
+        return
+    now = time.time()
+    for name in os.listdir(RESULT_FILE_DIR):
+        path = os.path.join(RESULT_FILE_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > RESULT_TTL:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+# 結果ファイルの出力先（推測されないランダムなディレクトリ）。前回の結果のファイルはストアが一緒に削除する
+def new_result_dir():
+    path = os.path.join(RESULT_FILE_DIR, uuid.uuid4().hex)
+    os.makedirs(path)
+    return path
+
+# 結果ファイルの静的配信 URL（ページからの相対パス）
+def static_url(path):
+    rel = os.path.relpath(path, os.path.dirname(RESULT_FILE_DIR))
+    return "app/static/" + "/".join(quote(part) for part in rel.split(os.sep))
+
+def get_upload_path(uploaded_file):
+    cleanup_uploads()
+    cached = st.session_state.get('upload_file')
+    if cached and cached['id'] == uploaded_file.file_id:
+        # 上限超過などで拒否したファイルは再実行のたびに読み直さない
+        if cached.get('error'):
+            raise ValueError(cached['error'])
+        if os.path.isfile(cached['path']):
+            os.utime(cached['dir'])  # 使用中のセッションは削除対象から外す
+            return cached['path']
+    if cached and os.path.isdir(cached['dir']):
+        tmpdir = cached['dir']
+    else:
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        tmpdir = tempfile.mkdtemp(prefix="clearvoice_", dir=UPLOAD_DIR)
+    if cached and os.path.isfile(cached['path']):
+        os.remove(cached['path'])
+    st.session_state.pop('upload_file', None)
+    path = os.path.join(tmpdir, os.path.basename(uploaded_file.name))
+    try:
+        if uploaded_file.size > MAX_UPLOAD_MB * 2**20:
+            raise ValueError(f"ファイルサイズが上限 ({MAX_UPLOAD_MB} MB) を超えています")
+        ingest_upload(uploaded_file, path, max_bytes=MAX_UPLOAD_MB * 2**20, max_duration=MAX_DURATION_MIN * 60)
+    except ValueError as e:
+        st.session_state['upload_file'] = {'id': uploaded_file.file_id, 'dir': tmpdir, 'path': path, 'error': str(e)}
+        raise
+    st.session_state['upload_file'] = {'id': uploaded_file.file_id, 'dir': tmpdir, 'path': path}
+    get_result_store().delete(result_key('preview'))
+    return path
+
+# 短い音声（プレビュー）用: 波形ピラミッドを一度に作る
+def build_overview(audio):
+    builder = PyramidBuilder()
+    builder.update(audio)
+    return builder.finalize().export()
+
+# A/B プレイヤー（元音源と処理後をシーク位置を保ったまま切り替え）
+# 全体処理の結果は静的配信の URL（input_url / output_url / mp3_url）から読み込み、
+# 短いプレビューだけはバイト列（input_wav / output）を data URI で埋め込む
+def render_player(res, title):
+    if 'output_url' in res:
+        in_src, out_src = res['input_url'], res['output_url']
+    else:
+        in_src = "data:audio/wav;base64," + base64.b64encode(res['input_wav']).decode()
+        out_src = "data:audio/wav;base64," + base64.b64encode(res['output']).decode()
+    mp3_src = res.get('mp3_url') or ""
+    has_mp3 = "true" if mp3_src else "false"
+    base_name = os.path.splitext(res['name'])[0]
+    dl_name_wav = base_name + "_enhanced.wav"
+    dl_name_mp3 = base_name + "_enhanced.mp3"
+    dl_name_wav_esc = dl_name_wav.replace("\\", "\\\\").replace("'", "\\'").replace('"', '\\"')
+    dl_name_mp3_esc = dl_name_mp3.replace("\\", "\\\\").replace("'", "\\'").replace('"', '\\"')
+    overview_json = json.dumps(res.get('overview'))
+    
+    st.subheader(title)
+    
+    # 成功メッセージ
+    st.markdown(f"""
+        <div class="success-box">
+            <div class="status">Success</div>
+            <div class="time">{res['time']:.1f}s</div>
+        </div>
+    """, unsafe_allow_html=True)
+    
+    # プレイヤー: UI 統一 / WAV・MP3 ダウンロード
+    st.components.v1.html(f"""
+        <style>
+            .player-wrap {{ max-width: 560px; margin: 1rem 0; font-family: inherit; }}
+            .player-src {{ display: flex; gap: 8px; margin-bottom: 14px; }}
+            .player-src button {{
+                padding: 6px 14px; border-radius: 6px; font-size: 0.8rem; font-weight: 500;
+                background: #1a1a1a; color: #e5e5e5; border: 1px solid #333; cursor: pointer;
+            }}
+            .player-src button.active {{ background: #333; color: #fff; border-color: #555; }}
+            .player-src button:hover {{ background: #262626; }}
+            .player-ctrl {{ display: flex; align-items: center; gap: 6px; margin-bottom: 10px; }}
+            .player-ctrl button {{
+                width: 36px; height: 36px; border-radius: 8px; border: 1px solid #333;
+                background: #1a1a1a; color: #e5e5e5; cursor: pointer; font-size: 0.9rem;
+                display: flex; align-items: center; justify-content: center; padding: 0;
+            }}
+            .player-ctrl button:hover {{ background: #262626; border-color: #444; }}
+            .player-ctrl .skip {{ width: auto; padding: 0 10px; font-size: 0.75rem; }}
+            .player-time {{ color: #888; font-size: 0.8rem; margin-bottom: 6px; font-variant-numeric: tabular-nums; }}
+            .player-seek {{ width: 100%; height: 6px; border-radius: 3px; accent-color: #fff; cursor: pointer; margin-bottom: 16px; }}
+            .player-view {{ margin-bottom: 8px; }}
+            .player-view canvas {{ width: 100%; height: 90px; background: #0a0a0a; border: 1px solid #333; border-radius: 6px; cursor: pointer; display: block; }}
+            .player-view-ctrl {{ display: flex; gap: 6px; margin-top: 6px; }}
+            .player-view-ctrl button {{
+                padding: 3px 10px; border-radius: 6px; font-size: 0.75rem;
+                background: #1a1a1a; color: #e5e5e5; border: 1px solid #333; cursor: pointer;
+            }}
+            .player-view-ctrl button.active {{ background: #333; color: #fff; border-color: #555; }}
+            .player-dl {{ display: flex; align-items: center; gap: 10px; flex-wrap: wrap; }}
+            .player-dl select {{
+                padding: 8px 12px; border-radius: 6px; font-size: 0.85rem;
+                background: #1a1a1a; color: #e5e5e5; border: 1px solid #333; cursor: pointer;
+            }}
+            .player-dl .dl-btn {{
+                padding: 10px 20px; border-radius: 6px; font-size: 0.9rem; font-weight: 600;
+                background: #fff; color: #000; border: 1px solid #fff; cursor: pointer;
+            }}
+            .player-dl .dl-btn:hover {{ background: #e5e5e5; border-color: #e5e5e5; }}
+        </style>
+        <div class="player-wrap">
+            <div class="player-src">
+                <button type="button" id="btnOrig">{T['input_label']}</button>
+                <button type="button" id="btnEnh">{T['output_label']}</button>
+            </div>
+            <div class="player-ctrl">
+                <span id="loadStatus" style="color:#888;font-size:0.8rem;margin-right:8px;"></span>
+                <button type="button" id="btnPlay" title="再生">▶</button>
+                <button type="button" id="btnPause" title="一時停止">⏸</button>
+                <button type="button" id="btnStop" title="停止">⏹</button>
+                <button type="button" id="btnBack10" class="skip" title="10秒戻る">−10</button>
+                <button type="button" id="btnFwd10" class="skip" title="10秒進む">+10</button>
+            </div>
+            <div class="player-view" id="viewWrap">
+                <canvas id="overview" height="90"></canvas>
+                <div class="player-view-ctrl">
+                    <button type="button" id="btnWave" class="active">Wave</button>
+                    <button type="button" id="btnSpec">Spectrogram</button>
+                    <button type="button" id="btnZoomIn" title="拡大">+</button>
+                    <button type="button" id="btnZoomOut" title="縮小">−</button>
+                    <button type="button" id="btnZoomAll" title="全体">All</button>
+                </div>
+            </div>
+            <div class="player-time" id="timeDisplay">0:00 / 0:00</div>
+            <input type="range" class="player-seek" id="seekBar" min="0" max="100" value="0" step="0.1">
+            <div class="player-dl">
+                <select id="dlFormat">
+                    <option value="wav">{T['dl_wav']}</option>
+                    <option value="mp3" id="optMp3">{T['dl_mp3']}</option>
+                </select>
+                <button type="button" id="btnDownload" class="dl-btn">{T['btn_download']}</button>
+            </div>
+        </div>
+        <textarea id="storeIn" style="display:none;width:0;height:0;">{html.escape(in_src)}</textarea>
+        <textarea id="storeOut" style="display:none;width:0;height:0;">{html.escape(out_src)}</textarea>
+        <textarea id="storeMp3" style="display:none;width:0;height:0;">{html.escape(mp3_src)}</textarea>
+        <audio id="a1" preload="auto"></audio>
+        <audio id="a2" preload="auto"></audio>
+        <script>
+            (function() {{
+                var a1 = document.getElementById('a1');
+                var a2 = document.getElementById('a2');
+                var seekBar = document.getElementById('seekBar');
+                var timeDisplay = document.getElementById('timeDisplay');
+                var btnOrig = document.getElementById('btnOrig');
+                var btnEnh = document.getElementById('btnEnh');
+                var btnPlay = document.getElementById('btnPlay');
+                var btnPause = document.getElementById('btnPause');
+                var btnStop = document.getElementById('btnStop');
+                var btnBack10 = document.getElementById('btnBack10');
+                var btnFwd10 = document.getElementById('btnFwd10');
+                var btnDownload = document.getElementById('btnDownload');
+                var dlFormat = document.getElementById('dlFormat');
+                var optMp3 = document.getElementById('optMp3');
+                var active = 1;
+                var dur = 0;
+                var hasMp3 = {has_mp3};
+                var dlNameWav = '{dl_name_wav_esc}';
+                var dlNameMp3 = '{dl_name_mp3_esc}';
+                var outSrc = document.getElementById('storeOut').value;
+                var mp3Src = document.getElementById('storeMp3').value;
+                var loadStatus = document.getElementById('loadStatus');
+                function b64ToBytes(b64) {{
+                    var bin = atob(b64);
+                    var buf = new Uint8Array(bin.length);
+                    for (var i = 0; i < bin.length; i++) buf[i] = bin.charCodeAt(i);
+                    return buf;
+                }}
+                // 波形・スペクトログラム: サーバで作った min/max ピラミッドを使い、描画は画面の列数に比例
+                var ov = {overview_json};
+                var cv = document.getElementById('overview');
+                var ctx = cv.getContext('2d');
+                var specMode = false;
+                var view0 = 0, view1 = 0;
+                if (ov) {{
+                    ['orig', 'enh'].forEach(function(k) {{
+                        ov[k].levels.forEach(function(l) {{
+                            l.minArr = new Int8Array(b64ToBytes(l.min).buffer);
+                            l.maxArr = new Int8Array(b64ToBytes(l.max).buffer);
+                        }});
+                        ov[k].bands.arr = b64ToBytes(ov[k].bands.data);
+                    }});
+                    view1 = ov.orig.frames / ov.sr;
+                }} else {{
+                    document.getElementById('viewWrap').style.display = 'none';
+                }}
+                function pickLevel(p, span, width) {{
+                    var best = p.levels[0];
+                    for (var i = 0; i < p.levels.length; i++) if (span >= width * p.levels[i].block) best = p.levels[i];
+                    return best;
+                }}
+                function drawWave(p, color, W, H) {{
+                    var f0 = view0 * ov.sr, span = (view1 - view0) * ov.sr, mid = H / 2;
+                    var lv = pickLevel(p, span, W), n = lv.minArr.length;
+                    ctx.fillStyle = color;
+                    for (var x = 0; x < W; x++) {{
+                        var a = Math.floor((f0 + span * x / W) / lv.block);
+                        var b = Math.max(a + 1, Math.floor((f0 + span * (x + 1) / W) / lv.block));
+                        if (a >= n) break;
+                        var mn = 127, mx = -127;
+                        for (var i = a; i < b && i < n; i++) {{
+                            if (lv.minArr[i] < mn) mn = lv.minArr[i];
+                            if (lv.maxArr[i] > mx) mx = lv.maxArr[i];
+                        }}
+                        var y0 = mid - mx / 127 * mid, y1 = mid - mn / 127 * mid;
+                        ctx.fillRect(x, y0, 1, Math.max(1, y1 - y0));
+                    }}
+                }}
+                function drawSpec(p, W, H) {{
+                    var bd = p.bands, nb = bd.n, rows = bd.arr.length / nb;
+                    var f0 = view0 * ov.sr, span = (view1 - view0) * ov.sr;
+                    var off = document.createElement('canvas');
+                    off.width = W; off.height = nb;
+                    var octx = off.getContext('2d');
+                    var img = octx.createImageData(W, nb);
+                    for (var x = 0; x < W; x++) {{
+                        var i = Math.floor((f0 + span * (x + 0.5) / W) / bd.block);
+                        if (i >= rows) break;
+                        for (var k = 0; k < nb; k++) {{
+                            var v = bd.arr[i * nb + k], o = ((nb - 1 - k) * W + x) * 4;
+                            img.data[o] = v;
+                            img.data[o + 1] = Math.max(0, v * 2 - 255);
+                            img.data[o + 2] = Math.min(255, 60 + v * 0.6);
+                            img.data[o + 3] = 255;
+                        }}
+                    }}
+                    octx.putImageData(img, 0, 0);
+                    ctx.imageSmoothingEnabled = false;
+                    ctx.drawImage(off, 0, 0, W, H);
+                }}
+                function drawOverview() {{
+                    if (!ov) return;
+                    var W = cv.clientWidth || 560, H = cv.height;
+                    if (cv.width !== W) cv.width = W;
+                    ctx.clearRect(0, 0, W, H);
+                    if (specMode) drawSpec(active === 1 ? ov.orig : ov.enh, W, H);
+                    else {{
+                        drawWave(ov.orig, active === 1 ? '#aaaaaa' : '#444444', W, H);
+                        drawWave(ov.enh, active === 2 ? '#ffffff' : '#666666', W, H);
+                    }}
+                    var t = curr().currentTime;
+                    if (t >= view0 && t <= view1) {{
+                        ctx.fillStyle = '#ff4d4f';
+                        ctx.fillRect(Math.floor((t - view0) / (view1 - view0) * W), 0, 1, H);
+                    }}
+                }}
+                function totalDur() {{ return dur || (ov ? ov.orig.frames / ov.sr : 0); }}
+                function setView(center, span) {{
+                    var total = totalDur();
+                    span = Math.min(total, Math.max(0.05, span));
+                    view0 = Math.max(0, Math.min(total - span, center - span / 2));
+                    view1 = view0 + span;
+                    drawOverview();
+                }}
+                document.getElementById('btnWave').onclick = function() {{
+                    specMode = false; this.classList.add('active');
+                    document.getElementById('btnSpec').classList.remove('active'); drawOverview();
+                }};
+                document.getElementById('btnSpec').onclick = function() {{
+                    specMode = true; this.classList.add('active');
+                    document.getElementById('btnWave').classList.remove('active'); drawOverview();
+                }};
+                document.getElementById('btnZoomIn').onclick = function() {{ setView(curr().currentTime, (view1 - view0) / 2); }};
+                document.getElementById('btnZoomOut').onclick = function() {{ setView(curr().currentTime, (view1 - view0) * 2); }};
+                document.getElementById('btnZoomAll').onclick = function() {{ setView(totalDur() / 2, totalDur()); }};
+                cv.addEventListener('wheel', function(e) {{
+                    e.preventDefault();
+                    var r = cv.getBoundingClientRect();
+                    var at = view0 + (e.clientX - r.left) / r.width * (view1 - view0);
+                    var span = (view1 - view0) * (e.deltaY < 0 ? 0.8 : 1.25);
+                    var frac = (at - view0) / (view1 - view0);
+                    setView(at - span * frac + span / 2, span);
+                }}, {{ passive: false }});
+                cv.onclick = function(e) {{
+                    var r = cv.getBoundingClientRect();
+                    var t = view0 + (e.clientX - r.left) / r.width * (view1 - view0);
+                    a1.currentTime = a2.currentTime = t;
+                    seekBar.value = t;
+                    timeDisplay.textContent = fmt(t) + ' / ' + fmt(dur);
+                    drawOverview();
+                }};
+                function initAudio() {{
+                    loadStatus.textContent = 'Preparing…';
+                    btnPlay.disabled = true;
+                    // 全体処理の結果はサーバのファイルを直接読む（ブラウザがシークに応じて部分的に取得する）
+                    a1.src = document.getElementById('storeIn').value;
+                    a2.src = outSrc;
+                    a1.preload = 'auto';
+                    a2.preload = 'auto';
+                    a1.load();
+                    a2.load();
+                    var ready = 0;
+                    function onReady() {{
+                        ready++;
+                        if (ready >= 2) {{
+                            loadStatus.textContent = '';
+                            btnPlay.disabled = false;
+                        }}
+                    }}
+                    a1.addEventListener('loadeddata', onReady, {{ once: true }});
+                    a2.addEventListener('loadeddata', onReady, {{ once: true }});
+                }}
+                if (typeof requestIdleCallback !== 'undefined')
+                    requestIdleCallback(initAudio, {{ timeout: 400 }});
+                else
+                    setTimeout(initAudio, 0);
+                if (!hasMp3) {{ optMp3.disabled = true; optMp3.textContent = optMp3.textContent + ' (n/a)'; }}
+                function curr() {{ return active === 1 ? a1 : a2; }}
+                function fmt(t) {{
+                    if (isNaN(t) || !isFinite(t)) return '0:00';
+                    var m = Math.floor(t / 60), s = Math.floor(t % 60);
+                    return m + ':' + (s < 10 ? '0' : '') + s;
+                }}
+                function setActive(n) {{
+                    active = n;
+                    btnOrig.classList.toggle('active', n === 1);
+                    btnEnh.classList.toggle('active', n === 2);
+                    a1.muted = (n !== 1);
+                    a2.muted = (n !== 2);
+                    if (n === 1) {{ a2.pause(); a2.currentTime = a1.currentTime; a1.play(); }}
+                    else {{ a1.pause(); a1.currentTime = a2.currentTime; a2.play(); }}
+                    drawOverview();
+                }}
+                btnOrig.onclick = function() {{ setActive(1); }};
+                btnEnh.onclick = function() {{ setActive(2); }};
+                btnPlay.onclick = function() {{ curr().play(); }};
+                btnPause.onclick = function() {{ a1.pause(); a2.pause(); }};
+                btnStop.onclick = function() {{
+                    a1.pause(); a2.pause();
+                    a1.currentTime = a2.currentTime = 0;
+                    seekBar.value = 0;
+                    timeDisplay.textContent = '0:00 / ' + fmt(dur);
+                }};
+                btnBack10.onclick = function() {{
+                    var t = Math.max(0, curr().currentTime - 10);
+                    a1.currentTime = a2.currentTime = t;
+                    seekBar.value = t;
+                    timeDisplay.textContent = fmt(t) + ' / ' + fmt(dur);
+                }};
+                btnFwd10.onclick = function() {{
+                    var t = Math.min(dur, curr().currentTime + 10);
+                    a1.currentTime = a2.currentTime = t;
+                    seekBar.value = t;
+                    timeDisplay.textContent = fmt(t) + ' / ' + fmt(dur);
+                }};
+                btnDownload.onclick = function() {{
+                    try {{
+                        var a = document.createElement('a');
+                        if (dlFormat.value === 'mp3' && hasMp3) {{
+                            a.href = mp3Src;
+                            a.download = dlNameMp3;
+                        }} else {{
+                            a.href = outSrc;
+                            a.download = dlNameWav;
+                        }}
+                        a.click();
+                    }} catch (e) {{ console.error(e); }}
+                }};
+                a1.onloadedmetadata = a2.onloadedmetadata = function() {{
+                    dur = Math.max(a1.duration || 0, a2.duration || 0);
+                    seekBar.max = dur;
+                    if (ov && view1 - view0 >= dur - 0.01) {{ view0 = 0; view1 = dur || view1; }}
+                    drawOverview();
+                }};
+                seekBar.oninput = function() {{
+                    var t = parseFloat(seekBar.value);
+                    a1.currentTime = a2.currentTime = t;
+                    timeDisplay.textContent = fmt(t) + ' / ' + fmt(dur);
+                    drawOverview();
+                }};
+                function onTime() {{
+                    var t = active === 1 ? a1.currentTime : a2.currentTime;
+                    a1.currentTime = a2.currentTime = t;
+                    seekBar.value = t;
+                    timeDisplay.textContent = fmt(t) + ' / ' + fmt(dur);
+                    // 再生位置が表示範囲の外に出たら追従する
+                    if (ov && (t < view0 || t > view1)) setView(t + (view1 - view0) / 2 - (view1 - view0) * 0.05, view1 - view0);
+                    else drawOverview();
+                }}
+                a1.ontimeupdate = a2.ontimeupdate = onTime;
+                a1.onloadedmetadata();
+            }})();
+        </script>
+    """, height=360)
+
 # メインコンテンツ
 st.markdown(f'<h1 class="main-title">{T["title"]} <span class="version-badge">{T["version"]}</span></h1>', unsafe_allow_html=True)
 st.markdown(f'<p class="sub-title" style="margin-bottom: 3rem;">{T["subtitle"]}</p>', unsafe_allow_html=True)
@@ -320,11 +807,13 @@ except Exception as e:
     st.error(f"AI Model Error: {e}")
     st.stop()
 
+cleanup_result_files()
+
 # ステップ1
 st.subheader(T['step1'])
 col_up1, col_up2 = st.columns([2, 1])
 with col_up1:
-    uploaded_file = st.file_uploader(T['uploader_label'], type=["wav", "m4a", "mp3", "aac"], label_visibility="collapsed")
+    uploaded_file = st.file_uploader(T['uploader_label'], type=["wav", "m4a", "mp3", "aac", "mp4", "mov", "mkv", "m4v"], label_visibility="collapsed")
 
 if uploaded_file:
     st.markdown("<br>", unsafe_allow_html=True)
@@ -332,302 +821,213 @@ if uploaded_file:
     st.markdown(f'<p style="color: var(--muted); font-size: 0.85rem; margin-top: -0.5rem; margin-bottom: 1rem;">{T["step2_hint"]}</p>', unsafe_allow_html=True)
     col_conf1, col_conf2 = st.columns([2, 1])
     with col_conf1:
+        tier = st.selectbox(T['tier_label'], list(model_service.TIERS), format_func=model_service.tier_label, help=T['tier_help'])
         atten_lim = st.slider(T['atten_label'], 0, 100, 0, help=T['atten_help'])
-        
+        keep_rate = st.checkbox(T['keep_rate_label'], value=False, help=T['keep_rate_help'])
+        downmix = st.checkbox(T['downmix_label'], value=False, help=T['downmix_help'])
+
+        # プレビュー: 指定位置の周辺だけをデコード・処理して A/B プレイヤーで試聴
+        try:
+            upload_path = get_upload_path(uploaded_file)
+            upload_duration = probe_audio(upload_path)['duration']
+        except Exception as e:
+            upload_path, upload_duration = None, 0.0
+            st.error(f"Error: {e}")
+        if upload_path and upload_duration > 0:
+            col_pv1, col_pv2 = st.columns([3, 1])
+            with col_pv1:
+                preview_pos = st.slider(
+                    T['preview_label'], 0.0, float(upload_duration), 0.0, step=1.0,
+                    help=T['preview_help'].format(length=PREVIEW_SECONDS)
+                )
+            with col_pv2:
+                st.markdown("<br>", unsafe_allow_html=True)
+                if st.button(T['btn_preview']):
+                    with st.spinner(T['status_preview']):
+                        try:
+                            model, df_state = get_model(tier)
+                            proc_start = time.time()
+                            original, enhanced, start = preview_file(
+                                model, df_state, upload_path, preview_pos,
+                                atten_lim_db=atten_lim, duration=upload_duration, downmix=downmix
+                            )
+                            put_result('preview', {
+                                'input_wav': to_wav_bytes(original, df_state.sr()),
+                                'output': to_wav_bytes(enhanced, df_state.sr()),
+                                'name': uploaded_file.name,
+                                'time': time.time() - proc_start,
+                                'start': start,
+                                'overview': {
+                                    'sr': df_state.sr(),
+                                    'orig': build_overview(original),
+                                    'enh': build_overview(enhanced),
+                                },
+                            })
+                        except Exception as e:
+                            st.error(f"Error: {e}")
+
         if st.button(T['btn_enhance']):
-            if 'processed_data' in st.session_state:
-                del st.session_state['processed_data']
-                
+            get_result_store().delete(result_key('result'))
+            st.session_state.pop('has_result', None)
+
             with st.status(T['status_processing'], expanded=True) as status:
-                with tempfile.TemporaryDirectory() as tmpdirname:
-                    try:
-                        input_path = os.path.join(tmpdirname, uploaded_file.name)
-                        with open(input_path, "wb") as f:
-                            f.write(uploaded_file.getvalue())
-                        
-                        st.write(T['status_preparing'])
-                        load_path = input_path
-                        if not input_path.lower().endswith(".wav"):
-                            temp_wav = os.path.join(tmpdirname, "temp.wav")
-                            # ffmpegの出力を詳細に取得
-                            result = subprocess.run(["ffmpeg", "-y", "-i", input_path, temp_wav], capture_output=True, text=True)
-                            if result.returncode != 0:
-                                st.error(f"FFmpeg Error: {result.stderr}")
-                            load_path = temp_wav
-                        
-                        audio, _ = load_audio(load_path, sr=df_state.sr())
-                        
-                        st.write(T['status_processing'])
-                        chunk_size = 30 * df_state.sr()
-                        total = audio.shape[1]
-                        chunks = []
-                        
-                        proc_start = time.time()
-                        p_bar = st.progress(0)
-                        for i in range(0, total, chunk_size):
-                            chunk = audio[:, i:i+chunk_size]
-                            enhanced_chunk = enhance(model, df_state, chunk, atten_lim_db=atten_lim)
-                            chunks.append(enhanced_chunk)
-                            p_bar.progress(min(int(i/total*100), 100))
-                        
-                        enhanced = torch.cat(chunks, dim=1)
-                        proc_duration = time.time() - proc_start
-                        
-                        st.write(T['status_saving'])
-                        output_path = os.path.join(tmpdirname, "enhanced.wav")
-                        save_audio(output_path, enhanced, sr=df_state.sr())
-                        with open(output_path, "rb") as f:
-                            audio_bytes = f.read()
-                        # MP3 を ffmpeg で生成（Download の形式選択用）
-                        mp3_path = os.path.join(tmpdirname, "enhanced.mp3")
-                        subprocess.run(
-                            ["ffmpeg", "-y", "-i", output_path, "-acodec", "libmp3lame", "-q:a", "2", mp3_path],
-                            capture_output=True, timeout=120
-                        )
-                        output_mp3 = b""
-                        if os.path.isfile(mp3_path):
-                            with open(mp3_path, "rb") as f:
-                                output_mp3 = f.read()
-                        # プレイヤー用に元音源もWAVで保存（シーク同期のため）
-                        input_wav_path = os.path.join(tmpdirname, "original.wav")
-                        save_audio(input_wav_path, audio, sr=df_state.sr())
-                        with open(input_wav_path, "rb") as f:
-                            input_wav_bytes = f.read()
-                        
-                        st.session_state['processed_data'] = {
-                            'input_wav': input_wav_bytes,
-                            'output': audio_bytes,
-                            'output_mp3': output_mp3,
-                            'name': uploaded_file.name,
-                            'time': proc_duration
-                        }
-                        status.update(label=T['status_done'].format(duration=proc_duration), state="complete")
-                        
-                        # Success表示直後にプレイヤーが出るまでの間に空のプレースホルダーでローディングを維持
-                        with st.spinner("結果を表示しています..."):
-                            time.sleep(0.5) # 描画の安定化のためのわずかな待ち時間
-                            st.rerun()
-                        
-                    except Exception as e:
-                        st.error(f"Error: {e}")
-                        status.update(label="❌ Error", state="error")
-
-    if 'processed_data' in st.session_state:
-        res = st.session_state['processed_data']
-        in_b64 = base64.b64encode(res['input_wav']).decode()
-        out_b64 = base64.b64encode(res['output']).decode()
-        output_mp3 = res.get('output_mp3') or b""
-        mp3_b64 = base64.b64encode(output_mp3).decode() if output_mp3 else ""
-        has_mp3 = "true" if output_mp3 else "false"
-        base_name = os.path.splitext(res['name'])[0]
-        dl_name_wav = base_name + "_enhanced.wav"
-        dl_name_mp3 = base_name + "_enhanced.mp3"
-        dl_name_wav_esc = dl_name_wav.replace("\\", "\\\\").replace("'", "\\'").replace('"', '\\"')
-        dl_name_mp3_esc = dl_name_mp3.replace("\\", "\\\\").replace("'", "\\'").replace('"', '\\"')
-        
-        st.subheader(T['step3'])
-        
-        # 成功メッセージ
-        st.markdown(f"""
-            <div class="success-box">
-                <div class="status">Success</div>
-                <div class="time">{res['time']:.1f}s</div>
-            </div>
-        """, unsafe_allow_html=True)
-        
-        # プレイヤー: Blob URL で再生を軽く / UI 統一 / WAV・MP3 ダウンロード
-        st.components.v1.html(f"""
-            <style>
-                .player-wrap {{ max-width: 560px; margin: 1rem 0; font-family: inherit; }}
-                .player-src {{ display: flex; gap: 8px; margin-bottom: 14px; }}
-                .player-src button {{
-                    padding: 6px 14px; border-radius: 6px; font-size: 0.8rem; font-weight: 500;
-                    background: #1a1a1a; color: #e5e5e5; border: 1px solid #333; cursor: pointer;
-                }}
-                .player-src button.active {{ background: #333; color: #fff; border-color: #555; }}
-                .player-src button:hover {{ background: #262626; }}
-                .player-ctrl {{ display: flex; align-items: center; gap: 6px; margin-bottom: 10px; }}
-                .player-ctrl button {{
-                    width: 36px; height: 36px; border-radius: 8px; border: 1px solid #333;
-                    background: #1a1a1a; color: #e5e5e5; cursor: pointer; font-size: 0.9rem;
-                    display: flex; align-items: center; justify-content: center; padding: 0;
-                }}
-                .player-ctrl button:hover {{ background: #262626; border-color: #444; }}
-                .player-ctrl .skip {{ width: auto; padding: 0 10px; font-size: 0.75rem; }}
-                .player-time {{ color: #888; font-size: 0.8rem; margin-bottom: 6px; font-variant-numeric: tabular-nums; }}
-                .player-seek {{ width: 100%; height: 6px; border-radius: 3px; accent-color: #fff; cursor: pointer; margin-bottom: 16px; }}
-                .player-dl {{ display: flex; align-items: center; gap: 10px; flex-wrap: wrap; }}
-                .player-dl select {{
-                    padding: 8px 12px; border-radius: 6px; font-size: 0.85rem;
-                    background: #1a1a1a; color: #e5e5e5; border: 1px solid #333; cursor: pointer;
-                }}
-                .player-dl .dl-btn {{
-                    padding: 10px 20px; border-radius: 6px; font-size: 0.9rem; font-weight: 600;
-                    background: #fff; color: #000; border: 1px solid #fff; cursor: pointer;
-                }}
-                .player-dl .dl-btn:hover {{ background: #e5e5e5; border-color: #e5e5e5; }}
-            </style>
-            <div class="player-wrap">
-                <div class="player-src">
-                    <button type="button" id="btnOrig">{T['input_label']}</button>
-                    <button type="button" id="btnEnh">{T['output_label']}</button>
-                </div>
-                <div class="player-ctrl">
-                    <span id="loadStatus" style="color:#888;font-size:0.8rem;margin-right:8px;"></span>
-                    <button type="button" id="btnPlay" title="再生">▶</button>
-                    <button type="button" id="btnPause" title="一時停止">⏸</button>
-                    <button type="button" id="btnStop" title="停止">⏹</button>
-                    <button type="button" id="btnBack10" class="skip" title="10秒戻る">−10</button>
-                    <button type="button" id="btnFwd10" class="skip" title="10秒進む">+10</button>
-                </div>
-                <div class="player-time" id="timeDisplay">0:00 / 0:00</div>
-                <input type="range" class="player-seek" id="seekBar" min="0" max="100" value="0" step="0.1">
-                <div class="player-dl">
-                    <select id="dlFormat">
-                        <option value="wav">{T['dl_wav']}</option>
-                        <option value="mp3" id="optMp3">{T['dl_mp3']}</option>
-                    </select>
-                    <button type="button" id="btnDownload" class="dl-btn">{T['btn_download']}</button>
-                </div>
-            </div>
-            <textarea id="storeIn" style="display:none;width:0;height:0;">{in_b64}</textarea>
-            <textarea id="storeOut" style="display:none;width:0;height:0;">{out_b64}</textarea>
-            <audio id="a1" preload="auto"></audio>
-            <audio id="a2" preload="auto"></audio>
-            <script>
-                (function() {{
-                    var a1 = document.getElementById('a1');
-                    var a2 = document.getElementById('a2');
-                    var seekBar = document.getElementById('seekBar');
-                    var timeDisplay = document.getElementById('timeDisplay');
-                    var btnOrig = document.getElementById('btnOrig');
-                    var btnEnh = document.getElementById('btnEnh');
-                    var btnPlay = document.getElementById('btnPlay');
-                    var btnPause = document.getElementById('btnPause');
-                    var btnStop = document.getElementById('btnStop');
-                    var btnBack10 = document.getElementById('btnBack10');
-                    var btnFwd10 = document.getElementById('btnFwd10');
-                    var btnDownload = document.getElementById('btnDownload');
-                    var dlFormat = document.getElementById('dlFormat');
-                    var optMp3 = document.getElementById('optMp3');
-                    var active = 1;
-                    var dur = 0;
-                    var hasMp3 = {has_mp3};
-                    var dlNameWav = '{dl_name_wav_esc}';
-                    var dlNameMp3 = '{dl_name_mp3_esc}';
-                    var mp3B64 = '{mp3_b64}';
-                    var blob1, blob2;
-                    var loadStatus = document.getElementById('loadStatus');
-                    function b64ToBlob(b64, type) {{
-                        var bin = atob(b64);
-                        var buf = new Uint8Array(bin.length);
-                        for (var i = 0; i < bin.length; i++) buf[i] = bin.charCodeAt(i);
-                        return new Blob([buf], {{ type: type }});
-                    }}
-                    function initAudio() {{
-                        loadStatus.textContent = 'Preparing…';
-                        btnPlay.disabled = true;
-                        var inB64 = document.getElementById('storeIn').value;
-                        var outB64 = document.getElementById('storeOut').value;
-                        blob1 = b64ToBlob(inB64, 'audio/wav');
-                        blob2 = b64ToBlob(outB64, 'audio/wav');
-                        a1.src = URL.createObjectURL(blob1);
-                        a2.src = URL.createObjectURL(blob2);
-                        a1.preload = 'auto';
-                        a2.preload = 'auto';
-                        a1.load();
-                        a2.load();
-                        var ready = 0;
-                        function onReady() {{
-                            ready++;
-                            if (ready >= 2) {{
-                                loadStatus.textContent = '';
-                                btnPlay.disabled = false;
-                            }}
-                        }}
-                        a1.addEventListener('loadeddata', onReady, {{ once: true }});
-                        a2.addEventListener('loadeddata', onReady, {{ once: true }});
-                    }}
-                    if (typeof requestIdleCallback !== 'undefined')
-                        requestIdleCallback(initAudio, {{ timeout: 400 }});
-                    else
-                        setTimeout(initAudio, 0);
-                    if (!hasMp3) {{ optMp3.disabled = true; optMp3.textContent = optMp3.textContent + ' (n/a)'; }}
-                    function curr() {{ return active === 1 ? a1 : a2; }}
-                    function fmt(t) {{
-                        if (isNaN(t) || !isFinite(t)) return '0:00';
-                        var m = Math.floor(t / 60), s = Math.floor(t % 60);
-                        return m + ':' + (s < 10 ? '0' : '') + s;
-                    }}
-                    function setActive(n) {{
-                        active = n;
-                        btnOrig.classList.toggle('active', n === 1);
-                        btnEnh.classList.toggle('active', n === 2);
-                        a1.muted = (n !== 1);
-                        a2.muted = (n !== 2);
-                        if (n === 1) {{ a2.pause(); a2.currentTime = a1.currentTime; a1.play(); }}
-                        else {{ a1.pause(); a1.currentTime = a2.currentTime; a2.play(); }}
-                    }}
-                    btnOrig.onclick = function() {{ setActive(1); }};
-                    btnEnh.onclick = function() {{ setActive(2); }};
-                    btnPlay.onclick = function() {{ curr().play(); }};
-                    btnPause.onclick = function() {{ a1.pause(); a2.pause(); }};
-                    btnStop.onclick = function() {{
-                        a1.pause(); a2.pause();
-                        a1.currentTime = a2.currentTime = 0;
-                        seekBar.value = 0;
-                        timeDisplay.textContent = '0:00 / ' + fmt(dur);
-                    }};
-                    btnBack10.onclick = function() {{
-                        var t = Math.max(0, curr().currentTime - 10);
-                        a1.currentTime = a2.currentTime = t;
-                        seekBar.value = t;
-                        timeDisplay.textContent = fmt(t) + ' / ' + fmt(dur);
-                    }};
-                    btnFwd10.onclick = function() {{
-                        var t = Math.min(dur, curr().currentTime + 10);
-                        a1.currentTime = a2.currentTime = t;
-                        seekBar.value = t;
-                        timeDisplay.textContent = fmt(t) + ' / ' + fmt(dur);
-                    }};
-                    btnDownload.onclick = function() {{
-                        try {{
-                            var blob, name, mime;
-                            if (dlFormat.value === 'mp3' && hasMp3 && mp3B64) {{
-                                blob = b64ToBlob(mp3B64, 'audio/mpeg');
-                                name = dlNameMp3;
-                            }} else {{
-                                blob = blob2;
-                                name = dlNameWav;
-                            }}
-                            var url = URL.createObjectURL(blob);
-                            var a = document.createElement('a');
-                            a.href = url;
-                            a.download = name;
-                            a.click();
-                            URL.revokeObjectURL(url);
-                        }} catch (e) {{ console.error(e); }}
-                    }};
-                    a1.onloadedmetadata = a2.onloadedmetadata = function() {{
-                        dur = Math.max(a1.duration || 0, a2.duration || 0);
-                        seekBar.max = dur;
-                    }};
-                    seekBar.oninput = function() {{
-                        var t = parseFloat(seekBar.value);
-                        a1.currentTime = a2.currentTime = t;
-                        timeDisplay.textContent = fmt(t) + ' / ' + fmt(dur);
-                    }};
-                    function onTime() {{
-                        var t = active === 1 ? a1.currentTime : a2.currentTime;
-                        a1.currentTime = a2.currentTime = t;
-                        seekBar.value = t;
-                        timeDisplay.textContent = fmt(t) + ' / ' + fmt(dur);
-                    }}
-                    a1.ontimeupdate = a2.ontimeupdate = onTime;
-                    a1.onloadedmetadata();
-                }})();
-            </script>
-        """, height=240)
+                muxer = None
+                job = None
+                result_dir = None
+                try:
+                    st.write(T['status_preparing'])
+                    model, df_state = get_model(tier)
+                    sr = df_state.sr()
+                    # アップロード済みの一時ファイルから ffmpeg でブロックごとにデコードしながら処理する
+                    # （全体をメモリに載せない。入力・出力の WAV も処理した分から順に書き出す）
+                    upload_path = get_upload_path(uploaded_file)
+                    info = probe_audio(upload_path)
+                    channels = info['channels']
+                    src_sr = info['sample_rate'] or sr
+                    out_sr = src_sr if keep_rate else sr
+                    total = max(1, int(round(info['duration'] * sr)))  # 進捗とチェックポイントのキーに使う目安
+                    # 結果の WAV は静的配信するので、配信できる大きさに収まらない入力は処理しない
+                    wav_mb = info['duration'] * max(sr, out_sr) * channels * 2 / 2**20
+                    if wav_mb > STATIC_MAX_MB:
+                        raise ValueError(T['wav_too_large'].format(size=wav_mb, limit=STATIC_MAX_MB))
+                    
+                    st.write(T['status_processing'])
+                    chunk_size = int(autotune.chunk_seconds(30, tier) * sr)
+                    orig_overview = PyramidBuilder()
+                    enh_overview = PyramidBuilder()
+                    
+                    proc_start = time.time()
+                    p_bar = st.progress(0)
+                    context = int(WARMUP_SECONDS * sr)
+
+                    # 完了したセグメントをチェックポイントとして残し、インスタンスが落ちても続きから再開する
+                    checkpoint.cleanup()
+                    job = checkpoint.CheckpointJob.open(
+                        checkpoint.file_digest(upload_path),
+                        {'sr': sr, 'atten_lim': atten_lim, 'context': context, 'downmix': downmix, 'tier': tier},
+                        total, chunk=chunk_size,
+                    )
+                    chunk_size = job.chunk or chunk_size
+                    if job.next_start > 0:
+                        st.write(T['status_resume'].format(percent=job.next_start / total * 100))
+
+                    result_dir = new_result_dir()
+                    # 動画は強調した音声を順次 ffmpeg に流し込み、映像はコピーのまま多重化する
+                    video_ext = os.path.splitext(upload_path)[1].lower()
+                    video_name = os.path.splitext(uploaded_file.name)[0] + "_enhanced" + video_ext
+                    video_path = None
+                    muxer = None
+                    if video_ext in VIDEO_EXTENSIONS and has_video(upload_path):
+                        # 配信できない大きさになる動画は作らない（音声だけ処理する）
+                        if estimate_muxed_size(upload_path, info) > STATIC_MAX_MB * 2**20:
+                            st.warning(T['video_too_large'].format(limit=STATIC_MAX_MB))
+                        else:
+                            video_path = os.path.join(result_dir, video_name)
+                            muxer = VideoMuxer(upload_path, video_path, sr, channels)
+                    output_path = os.path.join(result_dir, "enhanced.wav")
+                    # プレイヤー用に元音源もWAVで保存（シーク同期のため）
+                    input_wav_path = os.path.join(result_dir, "original.wav")
+                    saved = job.iter_segments()
+                    # keep_rate の場合は元のサンプルレートへブロックごとに戻しながら書き出す
+                    out_rs = StreamResampler(sr, out_sr, channels)
+                    blocks = stream_decode(upload_path, sr, channels, block=sr)
+                    with WavWriter(input_wav_path, sr, channels) as w_in, WavWriter(output_path, out_sr, channels) as w_out:
+                        for i, enhanced_chunk, original_chunk in iter_enhance_stream(
+                            model, df_state, blocks, chunk_size, context, atten_lim_db=atten_lim, downmix=downmix, first=job.next_start
+                        ):
+                            if enhanced_chunk is None:
+                                _, enhanced_chunk = next(saved)
+                            else:
+                                job.save(i, enhanced_chunk)
+                            w_in.write(original_chunk)
+                            w_out.write(out_rs.process(enhanced_chunk))
+                            if muxer is not None:
+                                muxer.write(enhanced_chunk)
+                            # 波形表示用のピラミッドも同じパスで作る
+                            orig_overview.update(original_chunk)
+                            enh_overview.update(enhanced_chunk)
+                            os.utime(os.path.dirname(upload_path))  # 処理中のアップロードは削除対象から外す
+                            p_bar.progress(min(int((i + enhanced_chunk.shape[1]) / total * 100), 100))
+                        w_out.write(out_rs.flush())
+                    
+                    if muxer is not None:
+                        muxer.close()
+                        muxer = None
+                        # 見積もりを超えてしまった場合も配信できないので音声だけを結果にする
+                        if os.path.getsize(video_path) > STATIC_MAX_MB * 2**20:
+                            st.warning(T['video_too_large'].format(limit=STATIC_MAX_MB))
+                            os.remove(video_path)
+                            video_path = None
+                    proc_duration = time.time() - proc_start
+                    model_service.record_inference(proc_duration, total / sr)
+                    
+                    st.write(T['status_saving'])
+                    # MP3 を ffmpeg で生成（Download の形式選択用）
+                    mp3_path = os.path.join(result_dir, "enhanced.mp3")
+                    subprocess.run(
+                        ["ffmpeg", "-y", "-i", output_path, "-acodec", "libmp3lame", "-q:a", "2", mp3_path],
+                        capture_output=True, timeout=120
+                    )
+                    
+                    # WAV・MP3・動画はディスクに置いたまま URL で渡す（ストアには小さなメタデータだけを置く）
+                    put_result('result', {
+                        'input_url': static_url(input_wav_path),
+                        'output_url': static_url(output_path),
+                        'mp3_url': static_url(mp3_path) if os.path.isfile(mp3_path) else None,
+                        'name': uploaded_file.name,
+                        'time': proc_duration,
+                        'video_path': video_path,
+                        'video_name': video_name,
+                        'overview': {
+                            'sr': sr,
+                            'orig': orig_overview.finalize().export(),
+                            'enh': enh_overview.finalize().export(),
+                        },
+                    }, files=[result_dir])
+                    result_dir = None  # 以後はストアが管理する
+                    # セッション側には小さな目印だけを残す（結果が破棄されたら再処理を促す）
+                    st.session_state['has_result'] = True
+                    job.remove()
+                    status.update(label=T['status_done'].format(duration=proc_duration), state="complete")
+                    
+                    # Success表示直後にプレイヤーが出るまでの間に空のプレースホルダーでローディングを維持
+                    with st.spinner("結果を表示しています..."):
+                        time.sleep(0.5) # 描画の安定化のためのわずかな待ち時間
+                        st.rerun()
+                    
+                except Exception as e:
+                    if muxer is not None:
+                        muxer.abort()
+                    st.error(f"Error: {e}")
+                    status.update(label="❌ Error", state="error")
+                finally:
+                    # 結果にならなかったファイルは残さない
+                    if result_dir is not None:
+                        shutil.rmtree(result_dir, ignore_errors=True)
+                    # 中断・失敗時は途中結果を残したままロックだけを手放す（次に同じ入力を処理すると続きから再開する）
+                    if job is not None:
+                        job.release()
+
+    res = get_result_store().get(result_key('result'))
+    pv = get_result_store().get(result_key('preview')) if res is None else None
+    if pv is not None:
+        pv_start = int(pv['start'])
+        render_player(pv, T['preview_title'].format(start=f"{pv_start // 60}:{pv_start % 60:02}"))
+
+    if res is None and st.session_state.get('has_result'):
+        st.info(T['result_expired'])
+
+    if res is not None:
+        render_player(res, T['step3'])
+        video_path = res.get('video_path')
+        if video_path and os.path.isfile(video_path):
+            # ディスク上のファイルをそのまま配信する（メモリにバイト列を作らない）
+            st.markdown(
+                f'<a href="{static_url(video_path)}" download="{html.escape(res["video_name"])}" target="_blank" '
+                f'style="display:inline-block;background:#fff;color:#000;border-radius:6px;font-weight:600;'
+                f'padding:0.6rem 1.5rem;text-decoration:none;margin-top:1rem;">{T["dl_video"]}</a>',
+                unsafe_allow_html=True,
+            )
 
 # フッター
 st.markdown("<br><br><br><br>", unsafe_allow_html=True)
@@ -654,8 +1054,11 @@ with st.expander("ドキュメント・技術仕様を表示"):
         Rustで書かれた高速エンジンにより、一般的なCPU環境でもリアルタイムに近い速度で処理が可能です。
 
         **プライバシー**
-        アップロードされたファイルはメモリ上でのみ処理され、セッション終了後に自動的に破棄されます。サーバーに保存されることはありません。
+        アップロードされたファイルと処理結果はサーバー上に一時的に置かれ、最後に使われてから30分程度で自動的に削除されます。
+        中断した処理を再開できるように、処理済みの音声（ノイズ除去後の区間）を最大24時間ストレージに保存します。処理が完了した時点で削除され、中断したままのものも24時間後に削除されます。
         """)
     with exp_col2:
         st.markdown("### 技術仕様")
-        st.code("サンプリングレート: 48kHz\nモデル: DeepFilterNet V3\nバックエンド: PyTorch / Rust")
+        # 処理モードごとのモデルを並べる（選んだモードによって使うモデルが変わる）
+        models = " / ".join(f"{info['model']} ({info['label']})" for info in model_service.TIERS.values())
+        st.code(f"サンプリングレート: 48kHz\nモデル: {models}\nバックエンド: PyTorch / Rust")